@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# benchmark runs the game headless over the shipped levels and over synthetic stress levels,
+# and reports per-frame timing percentiles as JSON so performance regressions show up as numbers.
+#
+# usage: python benchmark.py [--frames 600] [--scales 10 100 1000] [--output benchmark.json]
+
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pygame
+from game import Game
+from scripts.inputs import ScriptedInput
+
+# define the shipped levels the benchmark runs
+SHIPPED_MAPS = (0, 1, 2)
+# define the most memory a steady state entity tick may allocate in bytes, room for four transient int objects:
+# pixel and index arithmetic beyond the small int cache creates new ints and CPython keeps no free list for them
+ALLOCATION_BUDGET = 128
+# define the most memory any single entity tick of the window may allocate in bytes, the dash and shooting ticks included
+ALLOCATION_PEAK_BUDGET = 256
+# define the number of ticks between the shots the first enemy is made to fire during the entity allocation window
+SHOT_INTERVAL = 30
+
+# define a function to build a stress level by tiling copies of a level in a near square grid
+# grid tiles, offgrid decor and enemy spawners are all copied, only the first copy keeps the player spawner
+def build_stress_map(path, scale):
+    file = open(path, 'r')
+    base = json.load(file)
+    file.close()
+    tile_size = base['tile_size']
+    xs = [tile['pos'][0] for tile in base['tilemap'].values()]
+    ys = [tile['pos'][1] for tile in base['tilemap'].values()]
+    # leave a gap of a few tiles between the copies
+    width = max(xs) - min(xs) + 4
+    height = max(ys) - min(ys) + 4
+    columns = math.ceil(math.sqrt(scale))
+
+    tilemap = {}
+    offgrid = []
+    for copy in range(scale):
+        shift = ((copy % columns) * width, (copy // columns) * height)
+        for tile in base['tilemap'].values():
+            pos = [tile['pos'][0] + shift[0], tile['pos'][1] + shift[1]]
+            tilemap[str(pos[0]) + ';' + str(pos[1])] = {'type': tile['type'], 'variant': tile['variant'], 'pos': pos}
+        for tile in base['offgrid']:
+            if copy and tile['type'] == 'spawners' and tile['variant'] == 0:
+                continue
+            offgrid.append({'type': tile['type'], 'variant': tile['variant'], 'pos': [tile['pos'][0] + shift[0] * tile_size, tile['pos'][1] + shift[1] * tile_size]})
+    return {'tilemap': tilemap, 'tile_size': tile_size, 'offgrid': offgrid}
+
+# define a function to summarize a list of frame times in seconds as milliseconds
+def summarize(frame_times):
+    times = np.array(frame_times) * 1000
+    return {
+        'mean': float(times.mean()),
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'p99': float(np.percentile(times, 99)),
+        'max': float(times.max()),
+    }
+
+# define a function to measure the memory allocated by the entity ticks of a level in steady state with tracemalloc
+# the window of entity ticks is played twice: the first pass fills the caches (animations, collision rects, effect pools)
+# and the second one is measured, every tick the peak of traced memory above the traced memory before it is compared with
+# the peak of the same loop calling a function that does nothing, the function returns the median and the largest difference in bytes
+def entity_allocations(game, map_id, ticks, warmup, seed):
+    entities, states = prepare_entity_window(game, map_id, warmup, seed)
+    updates = [entity.update for entity in entities]
+    def idle(tilemap, movement):
+        pass
+    idles = [idle] * len(entities)
+    def peak(fns):
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for fn in fns:
+            fn(game.tilemap, (0, 0))
+        return tracemalloc.get_traced_memory()[1] - start
+    # trace the first pass too, so the blocks it allocates are known to tracemalloc when the second pass frees them
+    tracemalloc.start()
+    play_entity_window(game, entities, states, ticks, lambda: peak(updates))
+    overhead = max(peak(idles) for i in range(20))
+    # the first tick after the reset is left out, the values it replaces stay alive in the saved states instead of being freed
+    allocated = np.array([max(0, used - overhead) for used in play_entity_window(game, entities, states, ticks, lambda: peak(updates))[1:]])
+    tracemalloc.stop()
+    return {'median': int(np.median(allocated)), 'max': int(allocated.max())}
+
+# define a function to get a level ready for a window of entity ticks, returning the awake enemies and the player with their states
+# the level is played for a while so the enemies near the player are awake and every entity has seen its actions and tiles
+def prepare_entity_window(game, map_id, warmup, seed):
+    game.seed_random(seed)
+    game.load_level(map_id)
+    game.tick = 0
+    game.simulate(warmup, inputs=ScriptedInput.random(warmup, seed=seed))
+    entities = [game.awake_enemies[i] for i in sorted(game.awake_enemies)] + [game.player]
+    return entities, [entity.get_state() for entity in entities]
+
+# define a function to play a window of entity ticks from the saved states, tick is called once per tick to update the entities
+# the window starts with a dash and every SHOT_INTERVAL ticks the player is put next to the first enemy, which stops facing it,
+# so the dash and shooting ticks are part of it, the function returns the results of the tick calls
+def play_entity_window(game, entities, states, ticks, tick):
+    reset_entities(game, entities, states)
+    game.player.dash()
+    shooter = entities[0] if len(entities) > 1 else None
+    results = []
+    for i in range(ticks):
+        if shooter and not i % SHOT_INTERVAL:
+            # stand the player beside the enemy on the side it has ground on, and make the enemy stop there facing the player
+            shooter.flip = not game.tilemap.check_solid((shooter.rect().centerx + 7, shooter.pos[1] + 23))
+            game.player.pos[0] = shooter.pos[0] + (-1 if shooter.flip else 1)
+            game.player.pos[1] = shooter.pos[1]
+            game.player.velocity[1] = 0
+            shooter.walking = 1
+        results.append(tick())
+    return results
+
+# define a function to bring entities back to saved states and empty the effect pools their ticks fill
+# the game never updates the effects during an entity window, so the pools are emptied to keep them from growing
+def reset_entities(game, entities, states):
+    for entity, state in zip(entities, states):
+        entity.set_state(state)
+    game.particles.clear()
+    game.sparks.clear()
+    game.projectiles.clear()
+
+# define a function to run one scenario: load a level, play it with seeded random input and time every frame
+def run_scenario(game, name, map_id, frames, warmup, seed, render):
+    game.seed_random(seed)
+    game.load_level(map_id)
+    # restart the tick counter so the scripted input lines up with the level start
+    game.tick = 0
+    scenario = {
+        'name': name,
+        'tiles': int(np.count_nonzero(game.tilemap.grid_types)),
+        'offgrid_tiles': len(game.tilemap.offgrid_tiles),
+        'enemies': len(game.enemies),
+        'leaf_spawners': len(game.leaf_spawners),
+    }
+    inputs = ScriptedInput.random(warmup + frames, seed=seed)
+    game.simulate(warmup, inputs=inputs, render=render)
+    game.camera.reset_counters()
+    frame_times = []
+    scenario['ticks_per_second'] = game.simulate(frames, inputs=inputs, render=render, frame_times=frame_times)
+    scenario['frames'] = frames
+    scenario['frame_ms'] = summarize(frame_times)
+    # record how busy the effect systems were at the end of the run
+    scenario['particles'] = len(game.particles)
+    scenario['sparks'] = len(game.sparks)
+    scenario['projectiles'] = len(game.projectiles)
+    scenario['awake_enemies'] = len(game.awake_enemies)
+    # record how many of the objects each render path tested were culled during the timed frames
+    scenario['culling'] = {name: {'tested': tested, 'drawn': drawn, 'culled': culled} for name, (tested, drawn, culled) in game.camera.stats().items()}
+    return scenario
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ninja Dash benchmark')
+    parser.add_argument('--frames', type=int, default=600, help='number of timed frames per scenario')
+    parser.add_argument('--warmup', type=int, default=60, help='number of untimed frames before timing starts')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random number generator and the scripted input')
+    parser.add_argument('--scales', type=int, nargs='*', default=[10, 100, 1000], help='sizes of the stress levels, in copies of the base level')
+    parser.add_argument('--stress-base', type=int, default=1, help='shipped level the stress levels are built from')
+    parser.add_argument('--no-render', action='store_true', help='only time the game logic')
+    parser.add_argument('--output', default='benchmark.json', help='path of the JSON report')
+    parser.add_argument('--check-allocations', action='store_true', help='fail if the median entity tick of a shipped level allocates more than ALLOCATION_BUDGET bytes or any of its ticks more than ALLOCATION_PEAK_BUDGET bytes')
+    args = parser.parse_args()
+
+    # time the startup of the game, asset loading included
+    start = time.perf_counter()
+    game = Game(headless=True)
+    startup_ms = (time.perf_counter() - start) * 1000
+    print('startup %.1f ms' % startup_ms)
+    results = []
+    for map_id in SHIPPED_MAPS:
+        results.append(run_scenario(game, 'map_' + str(map_id), map_id, args.frames, args.warmup, args.seed, not args.no_render))
+        print('%-16s %8.3f ms p50 %8.3f ms p99' % (results[-1]['name'], results[-1]['frame_ms']['p50'], results[-1]['frame_ms']['p99']))
+
+    # measure the memory the entity ticks allocate, the entities reuse their rects, flags and animations so it stays within the budget
+    allocations = {}
+    for map_id in SHIPPED_MAPS:
+        allocations['map_' + str(map_id)] = entity_allocations(game, map_id, args.frames, args.warmup, args.seed)
+        print('%-16s %8d bytes median %8d bytes max allocated per entity tick' % ('map_' + str(map_id), allocations['map_' + str(map_id)]['median'], allocations['map_' + str(map_id)]['max']))
+    over_budget = [name for name, allocated in allocations.items() if allocated['median'] > ALLOCATION_BUDGET or allocated['max'] > ALLOCATION_PEAK_BUDGET]
+
+    # write the stress levels to a temporary directory and point the game at it
+    with tempfile.TemporaryDirectory() as map_dir:
+        game.map_dir = map_dir + os.sep
+        for scale in args.scales:
+            map_id = 'stress_' + str(args.stress_base) + '_x' + str(scale)
+            file = open(os.path.join(map_dir, map_id + '.json'), 'w')
+            json.dump(build_stress_map('data/maps/' + str(args.stress_base) + '.json', scale), file)
+            file.close()
+            results.append(run_scenario(game, map_id, map_id, args.frames, args.warmup, args.seed, not args.no_render))
+            print('%-16s %8.3f ms p50 %8.3f ms p99' % (results[-1]['name'], results[-1]['frame_ms']['p50'], results[-1]['frame_ms']['p99']))
+
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'warmup': args.warmup,
+        'render': not args.no_render,
+        'startup_ms': startup_ms,
+        'entity_allocation_bytes': allocations,
+        'scenarios': results,
+    }
+    file = open(args.output, 'w')
+    json.dump(report, file, indent=2)
+    file.close()
+    if args.check_allocations and over_budget:
+        raise SystemExit('entity ticks allocate more than %d bytes median or %d bytes max on %s' % (ALLOCATION_BUDGET, ALLOCATION_PEAK_BUDGET, ', '.join(over_budget)))
@@ -3,11 +3,19 @@
 
 import sys
 import pygame
-from scripts.tilemap import Tilemap
-from scripts.utils import load_img, load_images
+from scripts.tilemap import Tilemap, AUTOTILABLE_TILES
+from scripts.utils import load_img, load_images, use_bundle
+from scripts.saver import MapSaver
+from scripts.clouds import Clouds
+from scripts.parallax import ParallaxLayer
 
 
 RENDER_SCALE = 2.0
+# define the file the editor loads and saves with o, and the file it autosaves to
+MAP_PATH = 'map.json'
+AUTOSAVE_PATH = 'map.autosave.json'
+# define how many frames pass between two autosaves, a map that has not changed is not saved again
+AUTOSAVE_FRAMES = 60 * 30
 # define a class for the game
 class Game:
     # define the init method
@@ -25,7 +33,8 @@ class Game:
         # create a clock object to help control the frame rate
         self.clock = pygame.time.Clock()
 
-        # load the game assets(sprites)
+        # load the game assets(sprites), from the asset bundle if it has been built
+        use_bundle()
         self.assets = {
             'decor': load_images('tiles/decor'),
             'grass': load_images('tiles/grass'),
@@ -33,7 +42,9 @@ class Game:
             'stone': load_images('tiles/stone'),
             'spawners': load_images('tiles/spawners'),
         }
-
+        # draw the background and the clouds of the game behind the map, they are not tiles so they stay out of the tile list
+        self.background = ParallaxLayer(load_img('background.png'))
+        self.clouds = Clouds(load_images('clouds'), count=16, size=self.screen.get_size())
 
         self.tile_list = list(self.assets.keys())
         self.tile_group = 0
@@ -43,21 +54,43 @@ class Game:
 
         self.tilemap = Tilemap(self, 16)
         try:
-            self.tilemap.load('map.json')
+            self.tilemap.load(MAP_PATH)
         except FileNotFoundError:
             pass
+        # create the saver writing the map on a background thread, the loaded map counts as saved
+        self.saver = MapSaver()
+        self.saver.saved_revisions[AUTOSAVE_PATH] = self.tilemap.revision
+        self.frame = 0
 
         self.scroll = [0, 0]
         self.left_clicking = False
         self.right_clicking = False
         self.shift = False
         self.ongrid = True 
+        # autotile the painted or erased tile and its neighbors as you go, toggled with y
+        self.autotiling = True
+        # in selection mode (toggled with e) dragging with the left button selects a rect of tile positions instead of painting
+        # f fills the selection with the current tile, delete erases it, c copies it, m moves it and p pastes at the cursor
+        # b flood fills the area under the cursor with the current tile, empty areas only if they are enclosed, escape clears the selection
+        self.selecting = False
+        self.selection_start = None
+        self.selection = None
+        self.clipboard = None
+    # define a method to autotile a rect of tile positions after a region edit, if autotiling is on
+    def autotile_region(self, x0, y0, x1, y1):
+        if self.autotiling:
+            self.tilemap.autotile_region(x0, y0, x1, y1)
+
     # define a method to run the game
     def run(self):
         # update the players position and render it each frame
         while True:
+            # autosave the map every so often if it changed since the last autosave
+            self.frame += 1
+            if not self.frame % AUTOSAVE_FRAMES:
+                self.saver.save(self.tilemap, AUTOSAVE_PATH, force=False)
             # clear the screen each frame
-            self.screen.fill((0, 0, 0))
+            self.background.render(self.screen)
             
             current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
             current_tile_img.set_alpha(100)
@@ -65,6 +98,8 @@ class Game:
             self.scroll[0] += (self.movement[1] - self.movement[0]) * 2
             self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+            self.clouds.update()
+            self.clouds.render(self.screen, offset=render_scroll)
             self.tilemap.render(self.screen, render_scroll)
             mouse_pos = pygame.mouse.get_pos()
             mouse_pos = (mouse_pos[0] / RENDER_SCALE, mouse_pos[1] / RENDER_SCALE)
@@ -76,30 +111,47 @@ class Game:
                 self.screen.blit(current_tile_img, mouse_pos)
 
 
-            if self.left_clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
+            if self.selecting:
+                # show the selection, growing it while the left button is held
+                if self.left_clicking and self.selection_start:
+                    self.selection = (min(self.selection_start[0], tile_pos[0]), min(self.selection_start[1], tile_pos[1]),
+                                      max(self.selection_start[0], tile_pos[0]) + 1, max(self.selection_start[1], tile_pos[1]) + 1)
+                if self.selection:
+                    x0, y0, x1, y1 = self.selection
+                    pygame.draw.rect(self.screen, (255, 255, 255), (x0 * self.tilemap.tile_size - self.scroll[0], y0 * self.tilemap.tile_size - self.scroll[1], (x1 - x0) * self.tilemap.tile_size, (y1 - y0) * self.tilemap.tile_size), 1)
+            elif self.left_clicking and self.ongrid:
+                tile_type = self.tile_list[self.tile_group]
+                if self.autotiling:
+                    # an autotiled tile of the same type is left alone, its variant comes from its neighbors
+                    tile = self.tilemap.get_tile(tile_pos)
+                    if not (tile and tile['type'] == tile_type and tile_type in AUTOTILABLE_TILES):
+                        if self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant):
+                            self.tilemap.autotile_around(tile_pos)
+                else:
+                    self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant)
             if self.right_clicking:
-                tile_key = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_key in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_key]
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_rect = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
-                    if tile_rect.collidepoint(mouse_pos[0], mouse_pos[1]):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                if self.tilemap.remove_tile(tile_pos) and self.autotiling:
+                    self.tilemap.autotile_around(tile_pos)
+                # ask the spatial index for the offgrid tiles under the cursor instead of testing every tile
+                for tile in self.tilemap.offgrid_at((mouse_pos[0] + self.scroll[0], mouse_pos[1] + self.scroll[1])):
+                    self.tilemap.remove_offgrid(tile)
 
             self.screen.blit(current_tile_img, (10, 10))
             # set up an event listening loop
             for event in pygame.event.get():
                 # if the QUIT event happens, exit the program
                 if event.type == pygame.QUIT:
+                    # let a save in progress finish before exiting
+                    self.saver.wait()
                     pygame.quit()
                     sys.exit()
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
                         self.left_clicking = True
-                        if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mouse_pos[0] + self.scroll[0], mouse_pos[1] + self.scroll[1])})
+                        if self.selecting:
+                            self.selection_start = tile_pos
+                        elif not self.ongrid:
+                            self.tilemap.add_offgrid({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mouse_pos[0] + self.scroll[0], mouse_pos[1] + self.scroll[1])})
                     if event.button == 3:
                         self.right_clicking = True
                     if self.shift:
@@ -135,9 +187,38 @@ class Game:
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_o:
-                        self.tilemap.save('map.json')
+                        self.saver.save(self.tilemap, MAP_PATH)
                     if event.key == pygame.K_t:
                         self.tilemap.autotile()
+                    if event.key == pygame.K_y:
+                        self.autotiling = not self.autotiling
+                    if event.key == pygame.K_e:
+                        self.selecting = not self.selecting
+                        self.selection = None
+                    if event.key == pygame.K_ESCAPE:
+                        self.selection = None
+                    if event.key == pygame.K_b:
+                        filled = self.tilemap.flood_fill(tile_pos, self.tile_list[self.tile_group], self.tile_variant)
+                        if filled:
+                            self.autotile_region(*filled)
+                    if event.key == pygame.K_p and self.clipboard:
+                        self.tilemap.paste(self.clipboard, tile_pos)
+                        self.autotile_region(tile_pos[0], tile_pos[1], tile_pos[0] + self.clipboard['grid_types'].shape[0], tile_pos[1] + self.clipboard['grid_types'].shape[1])
+                    if self.selection:
+                        x0, y0, x1, y1 = self.selection
+                        if event.key == pygame.K_f:
+                            self.tilemap.fill_rect(x0, y0, x1, y1, self.tile_list[self.tile_group], self.tile_variant)
+                            self.autotile_region(x0, y0, x1, y1)
+                        if event.key == pygame.K_DELETE or event.key == pygame.K_BACKSPACE:
+                            self.tilemap.erase_rect(x0, y0, x1, y1)
+                            self.autotile_region(x0, y0, x1, y1)
+                        if event.key == pygame.K_c:
+                            self.clipboard = self.tilemap.copy_region(x0, y0, x1, y1)
+                        if event.key == pygame.K_m:
+                            self.tilemap.move_region(x0, y0, x1, y1, tile_pos)
+                            self.autotile_region(x0, y0, x1, y1)
+                            self.selection = (tile_pos[0], tile_pos[1], tile_pos[0] + x1 - x0, tile_pos[1] + y1 - y0)
+                            self.autotile_region(*self.selection)
                 # if the keyup event is triggered
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_LEFT or event.key == pygame.K_a:
@@ -1,22 +1,51 @@
 #!/usr/bin/env python
 # import the pygame module, so you can use it
 
+import argparse
 import math
+import os
 import random
 import sys
+import time
 import pygame
 from scripts.tilemap import Tilemap
+from scripts.mapformat import MAP_EXTENSION
 from scripts.entities import PhysicsEntity, Player, Enemy
-from scripts.utils import load_img, load_images, Animation
+from scripts.utils import load_img, load_images, flip_img, use_bundle, Animation
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.parallax import ParallaxLayer
+from scripts.particle import Particles
+from scripts.spark import Sparks
+from scripts.projectile import Projectiles
+from scripts.inputs import ScriptedInput
+from scripts.profiler import Profiler
+from scripts.spatial import SpatialHash
+from scripts.camera import Camera
+from scripts.level import LevelCache
+from scripts.replay import InputLog, Replay, SNAPSHOT_INTERVAL
+
+# define how far outside a screen centered on the player enemies keep updating, in pixels, enemies further away sleep until the player comes close
+# the horizontal margin is longer than the range of a projectile, so every enemy that could shoot the player is awake
+ACTIVATION_MARGIN = (544, 96)
+# define the size of the buckets of the grid the sleeping enemies are stored in, in pixels
+ACTIVITY_CELL_SIZE = 256
+# define the size of the buckets of the broadphase grid the awake enemies are stored in for hit tests, in pixels
+BROADPHASE_CELL_SIZE = 32
+# define the random streams of the game, each subsystem draws from its own so a replay stays in step even if one of them changes
+# the enemies stream only seeds the streams of the enemies when a level loads, every enemy then draws from its own
+RANDOM_STREAMS = ('enemies', 'leaves', 'clouds', 'effects')
 
 # define a class for the game
 class Game:
 
     # define the init method
-    def __init__(self):
+    # a headless game runs on SDL's dummy video driver, never presents frames and is driven through simulate()
+    # seed seeds the random streams of the game, a random seed is picked if it is None
+    def __init__(self, headless=False, seed=None):
+        self.headless = headless
+        if headless:
+            # the driver has to be chosen before the display is initialized
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         # initialize the pygame module
         pygame.init()
 
@@ -27,10 +56,13 @@ class Game:
         self.window = pygame.display.set_mode((640, 480), pygame.HWSURFACE | pygame.DOUBLEBUF)
 
         self.screen = pygame.Surface((320, 240))
+        # create the camera the frames are drawn through, the render paths skip what it cannot see
+        self.camera = Camera(self.screen.get_size())
         # create a clock object to help control the frame rate
         self.clock = pygame.time.Clock()
 
-        # load the game assets(sprites)
+        # load the game assets(sprites), from the asset bundle if it has been built
+        use_bundle()
         self.assets = {
             'decor': load_images('tiles/decor'),
             'grass': load_images('tiles/grass'),
@@ -51,152 +83,440 @@ class Game:
             'gun': load_img('gun.png'),
             'projectile': load_img('projectile.png'),
         }
+        # mirror the gun once instead of every frame an enemy faces left
+        self.assets['gun/flipped'] = flip_img(self.assets['gun'])
+
+        # seed the random streams before anything draws from them
+        self.seed_random(seed if seed is not None else random.randrange(1 << 32))
+
+        # create the effect pools and the parallax layers once, levels reuse them
+        self.particles = Particles(self)
+        self.projectiles = Projectiles(self)
+        self.sparks = Sparks()
+        self.background = ParallaxLayer(self.assets['background'])
+        self.clouds = Clouds(self.assets['clouds'], count=16, rng=self.rng['clouds'], size=self.screen.get_size())
 
         # create a list to store if the player's movement in the x direction
         self.movement_x = [False, False]
 
+        # create the profiler timing the stages of every frame, toggled with F3 and dumped with F4
+        self.profiler = Profiler()
+
+        # count the game logic ticks since the game started
+        self.tick = 0
+
+        # store the replay being recorded, which logs the input and snapshots, and the replay being played back
+        self.recording = None
+        self.playback = None
+
         # create a player object
         self.player = Player(self, (59, 50), (8, 15))
 
         self.tilemap = Tilemap(self, 16)
+        # store the directory the level files are loaded from
+        self.map_dir = 'data/maps/'
+        # create the cache of level templates and remember which level file the tilemap holds
+        self.levels = LevelCache()
+        self.tilemap_path = None
         
         self.load_level(0)
 
 
-    def load_level(self, map_id):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
-        self.enemies = []
-        self.leaf_spawners = []
-        for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
-            self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], tree['pos'][1], 23, 13))
-
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
-            if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
-                self.player.air_time = 0
-            else:
-                self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
+    # define a method to seed the random streams of the game, every stream gets its own generator derived from the seed
+    def seed_random(self, seed):
+        self.seed = seed
+        self.rng = {name: random.Random(str(seed) + '/' + name) for name in RANDOM_STREAMS}
 
-        self.particles = []
-        self.projectiles = []
+    # define a method to get the path of a level file, preferring the binary version of the level when it has been converted
+    def level_path(self, map_id):
+        path = self.map_dir + str(map_id)
+        if os.path.exists(path + MAP_EXTENSION):
+            return path + MAP_EXTENSION
+        return path + '.json'
 
-        self.clouds = Clouds(self.assets['clouds'], count=16)
-        self.sparks = []        
+    def load_level(self, map_id):
+        self.level = map_id
+        path = self.level_path(map_id)
+        # the level is built from its cached template, the map file is only read the first time
+        template = self.levels.get(path)
+        # a respawn keeps the tiles and the baked chunks, the spawners have already been extracted from them
+        if self.tilemap_path != path:
+            self.tilemap.restore(template.tilemap)
+            self.tilemap_path = path
+        self.leaf_spawners = [pygame.Rect(rect) for rect in template.leaf_spawners]
+        if template.player_pos:
+            self.player.pos = list(template.player_pos)
+            self.player.air_time = 0
+        # every enemy gets its own random stream, seeded in spawn order, so putting an enemy to sleep never changes what the others do
+        rng = self.rng['enemies']
+        self.enemies = [Enemy(self, pos, (8, 15), rng=random.Random(rng.getrandbits(64))) for pos in template.enemy_positions]
+        # every enemy starts asleep in the activity grid, keyed by its spawn index, and wakes once the player comes close
+        self.sleeping_enemies = SpatialHash(ACTIVITY_CELL_SIZE)
+        for i, enemy in enumerate(self.enemies):
+            self.sleeping_enemies.insert(i, enemy.rect())
+        # create a dictionary of the awake enemies keyed by their spawn index, they update in spawn order
+        self.awake_enemies = {}
+        self.spawned_enemies = list(self.enemies)
+        # create the broadphase grid holding the rects of the awake enemies, moved as they update, for the hit tests against the player
+        self.broadphase = SpatialHash(BROADPHASE_CELL_SIZE)
+
+        # the effect pools are emptied instead of rebuilt, so their arrays and sprite caches are reused
+        self.particles.clear()
+        self.projectiles.clear()
+        self.sparks.clear()
         self.scroll = [0, 0]
         self.dead = 0
+        self.player_visible = True
         self.allowed_hits = 1
 
-    # define a method to run the game
-    def run(self):
-        # update the players position and render it each frame
-        while True:
-            # clear the screen each frame
-            self.screen.blit(self.assets['background'], (0, 0))
-
-            if self.dead:
+        # build the template of the next level in the background so switching to it does not block the frame loop
+        if isinstance(map_id, int) and os.path.exists(self.level_path(map_id + 1)):
+            self.levels.preload(self.level_path(map_id + 1))
+
+    # define a method to handle a single input event
+    def handle_event(self, event):
+        # log the game keys into the replay being recorded, they take effect on the next tick
+        if self.recording and InputLog.records(event):
+            self.recording.log.record(self.tick, event)
+        # if the keydown event is triggered
+        if event.type == pygame.KEYDOWN:
+            # show the profiler overlay, timing only runs while it is shown or a trace is being recorded
+            if event.key == pygame.K_F3:
+                self.profiler.set_overlay(not self.profiler.overlay)
+            # write the recorded stages to a trace file
+            if event.key == pygame.K_F4:
+                self.profiler.dump('trace_' + str(int(time.time())) + '.json')
+            if event.key == pygame.K_LEFT:
+                self.movement_x[0] = True
+            if event.key == pygame.K_RIGHT:
+                self.movement_x[1] = True
+            if event.key == pygame.K_UP:
+                self.player.jump()
+            if event.key == pygame.K_x:
+                self.player.dash()
+
+        # if the keyup event is triggered
+        if event.type == pygame.KEYUP:
+            if event.key == pygame.K_LEFT:
+                self.movement_x[0] = False
+            if event.key == pygame.K_RIGHT:
+                self.movement_x[1] = False
+
+    # define a method to advance the game logic by one tick, without drawing anything
+    def update(self):
+        profiler = self.profiler
+        profiler.begin('update')
+        self.tick += 1
+        if self.dead:
+            self.dead += 1
+            if self.dead > 30:
+                profiler.begin('load_level')
+                self.load_level(self.level)
+                profiler.end()
+        self.scroll[0] += (self.player.rect().centerx - self.screen.get_width() / 2 - self.scroll[0]) / 30
+        self.scroll[1] += (self.player.rect().centery - self.screen.get_height() / 2 - self.scroll[1]) / 30
+
+        rng = self.rng['leaves']
+        for rect in self.leaf_spawners:
+            if rng.random() * 49999 < rect.width * rect.height:
+                pos = (rect.x + rng.random() * rect.width, rect.y + rng.random() * rect.height)
+                self.particles.add('leaf', pos, velocity=[-0.1, 0.3], frame=rng.randint(0, 20))
+
+        profiler.begin('clouds.update')
+        self.clouds.update()
+        profiler.end()
+
+        profiler.begin('enemies.update')
+        # wake the sleeping enemies inside the activation margin around the player
+        activation_rect = self.activation_rect()
+        for i in self.sleeping_enemies.query(activation_rect):
+            self.sleeping_enemies.remove(i)
+            self.awake_enemies[i] = self.spawned_enemies[i]
+        for i in sorted(self.awake_enemies):
+            enemy = self.awake_enemies[i]
+            enemy.update(self.tilemap, movement=(0, 0))
+            enemy_rect = enemy.rect()
+            if activation_rect.colliderect(enemy_rect):
+                self.broadphase.insert(i, enemy_rect)
+            else:
+                # put the enemies that left the margin back to sleep where they are
+                del self.awake_enemies[i]
+                self.broadphase.remove(i)
+                self.sleeping_enemies.insert(i, enemy_rect)
+        # the fast part of a dash kills every enemy the player touches, only the enemies in the buckets around the player are tested
+        killed = []
+        if abs(self.player.dashing) >= 46:
+            for i in sorted(self.broadphase.query(self.player.rect())):
+                enemy = self.awake_enemies.pop(i)
+                self.broadphase.remove(i)
+                enemy.dash_kill()
+                killed.append(enemy)
+        # remove the killed enemies after the loop, so no enemy is skipped this tick
+        if killed:
+            self.enemies = [enemy for enemy in self.enemies if enemy not in killed]
+        profiler.end()
+
+        # remember if the player was alive this tick, a hit later in the tick only hides the player from the next frame on
+        self.player_visible = not self.dead
+        if not self.dead:
+            # update the player's position depending on the user's input
+            profiler.begin('player.update')
+            self.player.update(self.tilemap, (self.movement_x[1] - self.movement_x[0], 0))
+            profiler.end()
+
+        # move the projectiles, removing the ones hitting a wall, running out of time or hitting the player
+        profiler.begin('projectiles.update')
+        hits = self.projectiles.update(self.tilemap, self.player)
+        rng = self.rng['effects']
+        for hit in range(hits):
+            if not self.allowed_hits:
                 self.dead += 1
-                if self.dead > 30:
-                    self.load_level(0)
-            self.scroll[0] += (self.player.rect().centerx - self.screen.get_width() / 2 - self.scroll[0]) / 30
-            self.scroll[1] += (self.player.rect().centery - self.screen.get_height() / 2 - self.scroll[1]) / 30
-
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+            else:
+                self.allowed_hits -= 1
+            for i in range(30):
+                angle = rng.random() * math.pi * 2
+                speed = rng.random() * 5
+                self.sparks.add(self.player.rect().center, angle=angle, speed=rng.random() * 3)
+                self.particles.add('particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=rng.randint(0, 7))
+
+        profiler.end()
+
+        profiler.begin('sparks.update')
+        self.sparks.update()
+        profiler.end()
+        profiler.begin('particles.update')
+        self.particles.update()
+        profiler.end()
+
+        # extend the replay being recorded to this tick and keep a snapshot every SNAPSHOT_INTERVAL ticks
+        if self.recording:
+            self.recording.end_tick = self.tick
+            if not self.tick % SNAPSHOT_INTERVAL:
+                self.recording.snapshots[self.tick] = self.get_state()
+        profiler.end()
+
+    # define a method to get the state of the game as a dictionary of plain values, used by replays
+    # the tilemap is not part of it, it is the one of the level file
+    def get_state(self):
+        return {
+            'tick': self.tick,
+            'seed': self.seed,
+            'level': self.level,
+            'rng': {name: rng.getstate() for name, rng in self.rng.items()},
+            'player': self.player.get_state(),
+            'movement_x': list(self.movement_x),
+            'scroll': list(self.scroll),
+            'dead': self.dead,
+            'player_visible': self.player_visible,
+            'allowed_hits': self.allowed_hits,
+            # store every spawned enemy by spawn index as (state, alive, awake)
+            'enemies': [(enemy.get_state(), enemy in self.enemies, i in self.awake_enemies) for i, enemy in enumerate(self.spawned_enemies)],
+            'particles': self.particles.get_state(),
+            'sparks': self.sparks.get_state(),
+            'projectiles': self.projectiles.get_state(),
+            'clouds': self.clouds.get_state(),
+        }
 
-            for rect in self.leaf_spawners:
-                if random.random() * 49999 < rect.width * rect.height:
-                    pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                    self.particles.append(Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
+    # define a method to bring the game to a state returned by get_state()
+    def set_state(self, state):
+        self.load_level(state['level'])
+        self.tick = state['tick']
+        self.seed = state['seed']
+        for name, rng_state in state['rng'].items():
+            self.rng[name].setstate(rng_state)
+        self.player.set_state(state['player'])
+        self.movement_x = list(state['movement_x'])
+        self.scroll = list(state['scroll'])
+        self.dead = state['dead']
+        self.player_visible = state['player_visible']
+        self.allowed_hits = state['allowed_hits']
+        # rebuild the enemy structures of load_level from the saved enemies
+        self.spawned_enemies = []
+        self.enemies = []
+        self.awake_enemies = {}
+        self.sleeping_enemies = SpatialHash(ACTIVITY_CELL_SIZE)
+        self.broadphase = SpatialHash(BROADPHASE_CELL_SIZE)
+        for i, (enemy_state, alive, awake) in enumerate(state['enemies']):
+            enemy = Enemy(self, enemy_state['pos'], (8, 15))
+            enemy.set_state(enemy_state)
+            self.spawned_enemies.append(enemy)
+            if not alive:
+                continue
+            self.enemies.append(enemy)
+            if awake:
+                self.awake_enemies[i] = enemy
+                self.broadphase.insert(i, enemy.rect())
+            else:
+                self.sleeping_enemies.insert(i, enemy.rect())
+        self.particles.set_state(state['particles'])
+        self.sparks.set_state(state['sparks'])
+        self.projectiles.set_state(state['projectiles'])
+        self.clouds.set_state(state['clouds'])
+
+    # define a method to get the rect in which enemies are awake, in pixels
+    # it is centered on the player rather than the camera, which lags behind the player and starts at the origin of a level,
+    # and grown to also cover what the camera sees, so no enemy on screen is asleep while the camera catches up
+    def activation_rect(self):
+        center = self.player.rect().center
+        width = self.screen.get_width() + ACTIVATION_MARGIN[0] * 2
+        height = self.screen.get_height() + ACTIVATION_MARGIN[1] * 2
+        rect = pygame.Rect(center[0] - width // 2, center[1] - height // 2, width, height)
+        margin = self.camera.margin + 1
+        return rect.union(pygame.Rect(self.scroll[0] - margin, self.scroll[1] - margin, self.screen.get_width() + margin * 2, self.screen.get_height() + margin * 2))
+
+    # define a method to draw the current state of the game onto the screen surface
+    def render(self):
+        profiler = self.profiler
+        profiler.begin('render')
+        # clear the screen each frame
+        profiler.begin('background.render')
+        render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+        camera = self.camera
+        camera.move(render_scroll)
+        self.background.render(self.screen, offset=render_scroll)
+        profiler.end()
+
+        profiler.begin('clouds.render')
+        self.clouds.render(self.screen, offset=render_scroll)
+        profiler.end()
+        profiler.begin('tilemap.render')
+        self.tilemap.render(self.screen, offset=render_scroll)
+        profiler.end()
+
+        profiler.begin('enemies.render')
+        # only awake enemies can be on screen, the activation rect covers the camera and its margin
+        for i in sorted(self.awake_enemies):
+            enemy = self.awake_enemies[i]
+            if camera.visible(enemy.rect(), 'enemies'):
+                enemy.render(self.screen, offset=render_scroll)
+        profiler.end()
+
+        if self.player_visible:
+            # render the player's image
+            profiler.begin('player.render')
+            self.player.render(self.screen, offset=render_scroll)
+            profiler.end()
+
+        profiler.begin('projectiles.render')
+        self.projectiles.render(self.screen, offset=render_scroll, camera=camera)
+        profiler.end()
+        profiler.begin('sparks.render')
+        self.sparks.render(self.screen, offset=render_scroll, camera=camera)
+        profiler.end()
+        profiler.begin('particles.render')
+        self.particles.render(self.screen, offset=render_scroll, camera=camera)
+        profiler.end()
+        profiler.end()
 
-            self.clouds.update()
-            self.clouds.render(self.screen, offset=render_scroll)
-            self.tilemap.render(self.screen, offset=render_scroll)
+    # define a method to run the game
+    def run(self):
+        # update the game and render it each frame
+        profiler = self.profiler
+        while True:
+            profiler.begin('frame')
+            # while a replay plays back, its logged input drives the game instead of the keyboard
+            if self.playback:
+                for event in self.playback.log.events(self.tick):
+                    self.handle_event(event)
+                if self.tick >= self.playback.end_tick:
+                    self.playback = None
+            self.update()
+            self.render()
 
-            for enemy in self.enemies:
-                kill = enemy.update(self.tilemap, movement=(0, 0))
-                enemy.render(self.screen, offset=render_scroll)
-                if kill:
-                    self.enemies.remove(enemy)
-
-            if not self.dead:
-                # update the player's position depending on the user's input
-                self.player.update(self.tilemap, (self.movement_x[1] - self.movement_x[0], 0))
-                # render the player's image
-                self.player.render(self.screen, offset=render_scroll)
-
-            # projectile object = [[x, y], direction, timer]
-            for projectile in self.projectiles.copy():
-                projectile[0][0] += projectile[1]
-                projectile[2] += 1
-                img = self.assets['projectile']
-                self.screen.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                if self.tilemap.check_solid(projectile[0]):
-                    self.projectiles.remove(projectile)
-                    for i in range(4):
-                        self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
-
-                elif projectile[2] > 360:
-                    self.projectiles.remove(projectile)
-                elif abs(self.player.dashing) < 44:
-                    if self.player.rect().collidepoint(projectile[0]):
-                        self.projectiles.remove(projectile)
-                        if not self.allowed_hits:
-                            self.dead += 1
-                        else:
-                            self.allowed_hits -= 1
-                        for i in range(30):
-                            angle = random.random() * math.pi * 2
-                            speed = random.random() * 5
-                            self.sparks.append(Spark(self.player.rect().center, angle=angle, speed=random.random() * 3))
-                            self.particles.append(Particle(self, 'particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
-
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.screen, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.screen, render_scroll)
-                if particle.type == 'leaf':
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.33
-                if kill:
-                    self.particles.remove(particle)
-
-            
             # set up an event listening loop
+            profiler.begin('events')
             for event in pygame.event.get():
                 # if the QUIT event happens, exit the program
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
-                # if the keydown event is triggered
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT:
-                        self.movement_x[0] = True
-                    if event.key == pygame.K_RIGHT:
-                        self.movement_x[1] = True
-                    if event.key == pygame.K_UP:
-                        self.player.jump()
-                    if event.key == pygame.K_x:
-                        self.player.dash()
-
-                # if the keyup event is triggered
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT:
-                        self.movement_x[0] = False
-                    if event.key == pygame.K_RIGHT:
-                        self.movement_x[1] = False
-
+                if self.playback and InputLog.records(event):
+                    continue
+                self.handle_event(event)
+            profiler.end()
 
             # blit the screen to the window and scale it to the window size
+            profiler.begin('scale')
             self.window.blit(pygame.transform.scale(self.screen, self.window.get_size()), (0, 0))
+            profiler.end()
+            # draw the profiler overlay on the window so it stays readable
+            self.profiler.render(self.window)
             # update the display each iteration of the loop
+            profiler.begin('display.update')
             pygame.display.update()
+            profiler.end()
+            profiler.end()
             # control the frame rate
             self.clock.tick(60)
 
-# create a game object
-game = Game()
-game.run()
-
+    # define a method to step the game a fixed number of ticks as fast as possible, taking input from a ScriptedInput
+    # nothing is presented and the frame rate is not limited, the method returns the number of ticks per second
+    # if a frame_times list is given, the duration of every tick in seconds is appended to it
+    def simulate(self, ticks, inputs=None, render=False, frame_times=None):
+        start = time.perf_counter()
+        tick_start = start
+        for i in range(ticks):
+            self.profiler.begin('frame')
+            # events of a tick are handled before it runs, like the events read at the end of the previous frame
+            if inputs:
+                for event in inputs.events(self.tick):
+                    self.handle_event(event)
+            self.update()
+            if render:
+                self.render()
+            self.profiler.end()
+            if frame_times is not None:
+                tick_end = time.perf_counter()
+                frame_times.append(tick_end - tick_start)
+                tick_start = tick_end
+        return ticks / max(time.perf_counter() - start, 1e-9)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ninja Dash')
+    parser.add_argument('--headless', action='store_true', help='simulate without a window and report the ticks per second')
+    parser.add_argument('--ticks', type=int, default=3600, help='number of ticks to simulate in headless mode')
+    parser.add_argument('--level', type=int, default=0, help='level to start on')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the random number generator and the scripted input')
+    parser.add_argument('--render', action='store_true', help='also render every tick in headless mode')
+    parser.add_argument('--trace', default=None, help='profile every frame and write a Chrome trace file to this path on exit')
+    parser.add_argument('--record', default=None, help='record the input of the session and write it as a replay to this path on exit')
+    parser.add_argument('--replay', default=None, help='play back a replay file')
+    parser.add_argument('--seek', type=int, default=None, help='with --replay, jump to this tick of the replay before playing on')
+    args = parser.parse_args()
+
+    # create a game object
+    game = Game(headless=args.headless, seed=args.seed)
+    if args.level:
+        game.load_level(args.level)
+    game.profiler.set_tracing(bool(args.trace))
+    if args.replay:
+        replay = Replay.load(args.replay)
+        game.set_state(replay.start_state)
+        if args.seek is not None:
+            replay.seek(game, min(args.seek, replay.end_tick))
+        game.playback = replay
+    if args.record:
+        Replay.record(game)
+    try:
+        if args.headless and args.replay:
+            # fast forward to the end of the replay
+            start = time.perf_counter()
+            ticks = replay.end_tick - game.tick
+            replay.play(game, ticks, render=args.render)
+            tps = ticks / max(time.perf_counter() - start, 1e-9)
+            print('replayed %d ticks to tick %d at %.0f ticks per second' % (ticks, game.tick, tps))
+        elif args.headless:
+            inputs = ScriptedInput.random(args.ticks, seed=args.seed)
+            tps = game.simulate(args.ticks, inputs=inputs, render=args.render)
+            print('simulated %d ticks of level %d at %.0f ticks per second' % (args.ticks, game.level, tps))
+            for name, (mean, p95, peak) in sorted(game.profiler.stats().items()):
+                print('%-20s mean %.3f ms  p95 %.3f ms  max %.3f ms' % (name, mean, p95, peak))
+            for name, (tested, drawn, culled) in sorted(game.camera.stats().items()):
+                print('%-20s %d tested  %d drawn  %.1f%% culled' % (name, tested, drawn, culled * 100))
+        else:
+            game.run()
+    finally:
+        if args.trace:
+            game.profiler.dump(args.trace)
+        if args.record:
+            game.recording.save(args.record)
@@ -0,0 +1,136 @@
+# bundle module contains the AssetBundle class, a single file packing the decoded pixels of every image under data/images,
+# so the game and the editor can load all of their sprites with one read instead of listing and decoding each PNG.
+#
+# file layout: magic (4 bytes) | version (uint32) | index size (uint32) | JSON index | raw RGB pixel data
+# the index maps every image path to [width, height, offset in the pixel data, colorkey]
+# and every directory to its image names in load order.
+# it also records the [mtime in ns, size] of every source image and directory when the bundle was built,
+# an image or a directory listing whose source changed since is loaded from the loose files instead.
+#
+# build the bundle with: python -m scripts.bundle [--measure]
+import argparse
+import json
+import os
+import struct
+import time
+import pygame
+
+# define the default location of the bundle
+BUNDLE_PATH = 'data/assets.bundle'
+# define the images directory the bundle is built from
+IMAGES_PATH = 'data/images/'
+BUNDLE_MAGIC = b'NDAB'
+BUNDLE_VERSION = 2
+HEADER = struct.Struct('<4sII')
+
+# define the AssetBundle class
+class AssetBundle:
+    def __init__(self, images, dirs, sources, pixels, images_path=IMAGES_PATH):
+        # store the index of the images and the directories
+        self.images = images
+        self.dirs = dirs
+        # store the [mtime in ns, size] of the source of every image and directory, and the directory they are under
+        self.sources = sources
+        self.images_path = images_path
+        # store the raw pixel data of every image, back to back
+        self.pixels = pixels
+
+    # define a class method to read a bundle file with a single read
+    @classmethod
+    def load(cls, path=BUNDLE_PATH):
+        file = open(path, 'rb')
+        data = file.read()
+        file.close()
+        magic, version, index_size = HEADER.unpack_from(data)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError('unsupported asset bundle: ' + path)
+        index = json.loads(data[HEADER.size:HEADER.size + index_size])
+        return cls(index['images'], index['dirs'], index['sources'], memoryview(data)[HEADER.size + index_size:])
+
+    # define a method to check if the source of an image or directory is unchanged since the bundle was built
+    def fresh(self, path):
+        try:
+            stat = os.stat(self.images_path + path)
+        except OSError:
+            return False
+        return self.sources.get(path) == [stat.st_mtime_ns, stat.st_size]
+
+    # define a method to check if the bundle holds an up to date image, path is relative to the images directory
+    def __contains__(self, path):
+        return path in self.images and self.fresh(path)
+
+    # define a method to get the image names of a directory, or None if the bundle does not have the directory or it changed
+    def listing(self, path):
+        if path in self.dirs and self.fresh(path):
+            return self.dirs[path]
+        return None
+
+    # define a method to create the surface of an image, converted to the display format with its colorkey set
+    def img(self, path):
+        width, height, offset, colorkey = self.images[path]
+        img = pygame.image.frombuffer(self.pixels[offset:offset + width * height * 3], (width, height), 'RGB').convert()
+        if colorkey is not None:
+            img.set_colorkey(colorkey, pygame.RLEACCEL)
+        return img
+
+# define a function to build a bundle from every PNG under the images directory, every image is keyed by black
+def build_bundle(path=BUNDLE_PATH, images_path=IMAGES_PATH):
+    images = {}
+    dirs = {}
+    sources = {}
+    chunks = []
+    offset = 0
+    for root, dir_names, file_names in os.walk(images_path):
+        dir_names.sort()
+        rel_dir = os.path.relpath(root, images_path).replace(os.sep, '/')
+        names = sorted(name for name in file_names if name.endswith('.png'))
+        if rel_dir != '.':
+            dirs[rel_dir] = names
+            stat = os.stat(root)
+            sources[rel_dir] = [stat.st_mtime_ns, stat.st_size]
+        for name in names:
+            rel_path = name if rel_dir == '.' else rel_dir + '/' + name
+            img = pygame.image.load(os.path.join(root, name))
+            data = pygame.image.tobytes(img, 'RGB')
+            images[rel_path] = [img.get_width(), img.get_height(), offset, [0, 0, 0]]
+            stat = os.stat(os.path.join(root, name))
+            sources[rel_path] = [stat.st_mtime_ns, stat.st_size]
+            chunks.append(data)
+            offset += len(data)
+
+    index = json.dumps({'images': images, 'dirs': dirs, 'sources': sources}).encode('utf-8')
+    file = open(path, 'wb')
+    file.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index)))
+    file.write(index)
+    for data in chunks:
+        file.write(data)
+    file.close()
+    return len(images)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='build the asset bundle')
+    parser.add_argument('--output', default=BUNDLE_PATH, help='path of the bundle file')
+    parser.add_argument('--measure', action='store_true', help='compare loading every image from the directories and from the bundle')
+    args = parser.parse_args()
+
+    count = build_bundle(args.output)
+    print('packed %d images into %s (%d bytes)' % (count, args.output, os.path.getsize(args.output)))
+
+    if args.measure:
+        from scripts import utils
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        bundle = AssetBundle.load(args.output)
+        for name, source in (('directories', None), ('bundle', args.output)):
+            start = time.perf_counter()
+            utils.use_bundle(source)
+            for path in bundle.images:
+                # directories holding subdirectories cannot go through load_images, so their images are loaded one by one
+                directory = path.rpartition('/')[0]
+                if not directory or any(other.startswith(directory + '/') for other in bundle.dirs):
+                    utils.load_img(path)
+            for directory, names in bundle.dirs.items():
+                if names and not any(other.startswith(directory + '/') for other in bundle.dirs):
+                    utils.load_images(directory)
+            print('loading every image from the %s took %.1f ms' % (name, (time.perf_counter() - start) * 1000))
@@ -0,0 +1,62 @@
+# camera module contains the Camera class, the viewport the game is drawn through. it gives the render paths a cheap test
+# of whether something can be seen, against the visible rect grown by a margin, and counts how much each of them culls.
+# culling only skips drawing, whatever is culled keeps updating.
+import numpy as np
+import pygame
+
+# define how far outside the screen something still counts as visible, in pixels
+# it covers the parts drawn around an object's position: the animation offset, the enemy gun and the particle sprites
+CULL_MARGIN = 16
+
+# define the Camera class
+class Camera:
+    def __init__(self, size, margin=CULL_MARGIN):
+        self.size = size
+        self.margin = margin
+        # store the offset the frame is drawn with, the top left corner of the screen in the world
+        self.offset = (0, 0)
+        # create the rect of the world that is visible, grown by the margin, moved with the camera
+        self.rect = pygame.Rect(-margin, -margin, size[0] + margin * 2, size[1] + margin * 2)
+        # create a dictionary of the culling counters of every render path, as [tested, drawn] since the last reset
+        self.counters = {}
+
+    # define a method to move the camera to the offset of a frame
+    def move(self, offset):
+        self.offset = offset
+        self.rect.x = offset[0] - self.margin
+        self.rect.y = offset[1] - self.margin
+
+    # define a method to count the objects a render path tested and drew
+    def count(self, name, tested, drawn):
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = [0, 0]
+        counter[0] += tested
+        counter[1] += drawn
+
+    # define a method to tell if a rect in the world can be seen, counted under name
+    def visible(self, rect, name):
+        visible = self.rect.colliderect(rect)
+        self.count(name, 1, visible)
+        return visible
+
+    # define a method to get a mask of the objects that can be seen, counted under name
+    # pos is an (n, 2) array of the centers of the objects in the world and half_sizes their half extents,
+    # a number, an (n,) array for square objects or an (n, 2) array
+    def cull(self, pos, half_sizes, name):
+        half_sizes = np.asarray(half_sizes)
+        if half_sizes.ndim == 1:
+            half_sizes = half_sizes[:, None]
+        starts = pos - half_sizes
+        ends = pos + half_sizes
+        mask = (ends[:, 0] >= self.rect.left) & (starts[:, 0] < self.rect.right) & (ends[:, 1] >= self.rect.top) & (starts[:, 1] < self.rect.bottom)
+        self.count(name, len(mask), int(np.count_nonzero(mask)))
+        return mask
+
+    # define a method to get the culling statistics of every render path, as {name: (tested, drawn, culled fraction)}
+    def stats(self):
+        return {name: (tested, drawn, 1 - drawn / tested if tested else 0.0) for name, (tested, drawn) in self.counters.items()}
+
+    # define a method to reset the culling counters
+    def reset_counters(self):
+        self.counters = {}
@@ -1,4 +1,9 @@
 import random
+import pygame
+from scripts.parallax import ParallaxLayer, Parallax
+
+# define the number of depth bands the clouds are grouped into, the clouds of a band scroll and drift together
+CLOUD_BANDS = 4
 
 class Cloud:
     def __init__(self, pos, img, speed, depth):
@@ -7,26 +12,59 @@ class Cloud:
         self.speed = speed
         self.depth = depth
 
-    def update(self):
-        self.pos[0] += self.speed
-
-    def render(self, surface, offset=(0, 0)):
-        render_pos = (self.pos[0] - offset[0] * self.depth , self.pos[1] - offset[1] * self.depth)
-        surface.blit(self.img, (render_pos[0] % (surface.get_width() + self.img.get_width()) - self.img.get_width(), render_pos[1] % (surface.get_height() + self.img.get_height()) - self.img.get_height()))
-
-class Clouds:
-    def __init__(self, cloud_images, count=16):
+# define the Clouds class, a parallax of cloud bands: every band is baked once with its clouds and drawn with one blit,
+# so the cost of drawing the clouds depends on the number of bands, not on the number of clouds
+class Clouds(Parallax):
+    # rng is the random number generator the clouds are placed with, the random module by default
+    # size is the size of the screen the clouds wrap around
+    def __init__(self, cloud_images, count=16, rng=random, bands=CLOUD_BANDS, size=(320, 240)):
+        super().__init__()
+        self.images = cloud_images
+        self.bands = bands
+        self.size = size
         self.clouds = []
 
         for i in range(count):
-            self.clouds.append(Cloud((random.random() * 99999, random.random() * 99999), random.choice(cloud_images), random.random() * 0.05 + 0.05, random.random() * 0.6 + 0.2))
-        
+            self.clouds.append(Cloud((rng.random() * 99999, rng.random() * 99999), rng.choice(cloud_images), rng.random() * 0.05 + 0.05, rng.random() * 0.6 + 0.2))
+
         self.clouds.sort(key=lambda x: x.depth)
+        self.build()
 
-    def update(self):
+    # define a method to group the clouds into bands of equal depth ranges and paint every band onto a tile wrapping around the screen
+    # a band scrolls at the mean depth of its clouds and drifts at their mean speed
+    def build(self):
+        self.layers = []
+        if not self.clouds:
+            return
+        # the tile is larger than the screen by the largest cloud, so a cloud leaves the screen before it comes back on the other side
+        tile_size = (self.size[0] + max(img.get_width() for img in self.images), self.size[1] + max(img.get_height() for img in self.images))
+        low = self.clouds[0].depth
+        band_depth = (self.clouds[-1].depth - low) / self.bands or 1
+        bands = {}
         for cloud in self.clouds:
-            cloud.update()
-    
-    def render(self, surface, offset=(0, 0)):
-        for cloud in self.clouds:
-            cloud.render(surface, offset=offset)
\ No newline at end of file
+            bands.setdefault(min(int((cloud.depth - low) / band_depth), self.bands - 1), []).append(cloud)
+        for band in sorted(bands):
+            clouds = bands[band]
+            tile = pygame.Surface(tile_size)
+            tile.set_colorkey((0, 0, 0))
+            for cloud in clouds:
+                x, y = cloud.pos[0] % tile_size[0], cloud.pos[1] % tile_size[1]
+                # a cloud crossing the right or bottom edge of the tile is painted again on the opposite edge
+                for dx in (0, -tile_size[0]):
+                    for dy in (0, -tile_size[1]):
+                        tile.blit(cloud.img, (x + dx, y + dy))
+            self.layers.append(ParallaxLayer(tile, depth=sum(cloud.depth for cloud in clouds) / len(clouds), speed=sum(cloud.speed for cloud in clouds) / len(clouds)))
+
+    # define a method to get the clouds as (pos, image index, speed, depth) and the drift of every band, used by replay snapshots
+    def get_state(self):
+        return {
+            'clouds': [(tuple(cloud.pos), self.images.index(cloud.img), cloud.speed, cloud.depth) for cloud in self.clouds],
+            'drift': [layer.drift for layer in self.layers],
+        }
+
+    # define a method to replace the clouds with the ones of get_state()
+    def set_state(self, state):
+        self.clouds = [Cloud(pos, self.images[img], speed, depth) for pos, img, speed, depth in state['clouds']]
+        self.build()
+        for layer, drift in zip(self.layers, state['drift']):
+            layer.drift = drift
@@ -4,15 +4,18 @@
 # the update method of the PhysicsEntity class is used to update the entity's position,
 # while checking for collisions with the tilemap.
 
-import random
 import math
+import random
 import pygame
 from scripts.utils import Animation
-from scripts.particle import Particle
-from scripts.spark import Spark
 
 # define the PhysicsEntity class
+# entities keep their attributes in slots, and their rect, collision flags and animations are created once and reused,
+# so updating an entity does not allocate
 class PhysicsEntity:
+    __slots__ = ('game', 'type', 'pos', 'size', 'velocity', 'collision_flags', 'last_movement', 'action', 'anim_offset', 'flip',
+                 'animation', 'animations', 'entity_rect', 'tile_rects')
+
     # define the constructor with the game, entity type, position, and size as parameters
     def __init__(self, game, e_type, pos, size):
         self.game = game
@@ -23,36 +26,54 @@ class PhysicsEntity:
         self.velocity = [0, 0]
         # create a dictionary to store the collision flags to keep track of the collisions
         self.collision_flags = {'up': False, 'down': False, 'right': False, 'left': False}
+        # create the rect returned by rect() and the list the tilemap fills with the solid tiles around the entity
+        self.entity_rect = pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+        self.tile_rects = []
 
         self.last_movement = [0, 0]
         self.action = ''
+        # create a dictionary of the animations of the entity by action, an animation is copied from the assets
+        # the first time its action starts and restarted when the action starts again
+        self.animations = {}
         self.anim_offset = (-3, -3)
         self.flip = False
         self.set_action('idle')
 
     # define a method to get the rect of the entity needed for collision detection
+    # the same rect is returned by every call and moved to the entity, copy it to keep it after the entity moves
     def rect(self):
-        return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
-    
+        rect = self.entity_rect
+        # truncate the position like the Rect constructor does, assigning a float to a rect attribute rounds it
+        rect.x = int(self.pos[0])
+        rect.y = int(self.pos[1])
+        return rect
+
     def set_action(self, action):
         if action != self.action:
             self.action = action
-            self.animation = self.game.assets[self.type + '/' + self.action].copy()
+            animation = self.animations.get(action)
+            if animation is None:
+                animation = self.animations[action] = self.game.assets[self.type + '/' + action].copy()
+            else:
+                animation.reset()
+            self.animation = animation
 
     # define a method to update the entity's position while checking for collisions
     def update(self, tilemap, movement=(0, 0)):
         # set the collision flags to false at the start of the frame
-        self.collision_flags = {'up': False, 'down': False, 'right': False, 'left': False}
+        collision_flags = self.collision_flags
+        collision_flags['up'] = collision_flags['down'] = collision_flags['right'] = collision_flags['left'] = False
         # add the movement vector to the velocity vector to move the entity
-        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
+        movement_x = movement[0] + self.velocity[0]
+        movement_y = movement[1] + self.velocity[1]
 
         # move the entity in the x direction
-        self.pos[0] += frame_movement[0]
+        self.pos[0] += movement_x
 
         # get the rect of the entity
         entity_rect = self.rect()
         # loop through the neighboring tiles to check for collisions
-        for tile_rect in tilemap.neighboring_tiles_physics(self.pos):
+        for tile_rect in tilemap.neighboring_tiles_physics(self.pos, self.tile_rects):
             # check if the entity rect collides with the current tile rect
             if entity_rect.colliderect(tile_rect):
 
@@ -60,21 +81,21 @@ class PhysicsEntity:
                 # pygame.draw.rect(self.game.screen, (255, 0, 0), tile_rect, 1)
 
                 # check the direction of the movement and adjust the entity's position accordingly
-                if frame_movement[0] > 0:
+                if movement_x > 0:
                     entity_rect.right = tile_rect.left
-                    self.collision_flags['right'] = True
-                if frame_movement[0] < 0:
+                    collision_flags['right'] = True
+                if movement_x < 0:
                     entity_rect.left = tile_rect.right
-                    self.collision_flags['left'] = True
+                    collision_flags['left'] = True
                 # set the entity's position to the adjusted position of the entity's rect
                 self.pos[0] = entity_rect.x
         
         # apply gravity to the entity (move the entity in the y direction downwards)
-        self.pos[1] += frame_movement[1]
+        self.pos[1] += movement_y
         # get the rect of the entity
         entity_rect = self.rect()
         # loop through the neighboring tiles to check for collisions
-        for tile_rect in tilemap.neighboring_tiles_physics(self.pos):
+        for tile_rect in tilemap.neighboring_tiles_physics(self.pos, self.tile_rects):
             # check if the entity rect collides with the current tile rect
             if entity_rect.colliderect(tile_rect):
                 
@@ -82,12 +103,12 @@ class PhysicsEntity:
                 # pygame.draw.rect(self.game.screen, (255, 0, 0), tile_rect, 1)
 
                 # check the direction of the movement and adjust the entity's position accordingly
-                if frame_movement[1] > 0:
+                if movement_y > 0:
                     entity_rect.bottom = tile_rect.top
-                    self.collision_flags['down'] = True
-                if frame_movement[1] < 0:
+                    collision_flags['down'] = True
+                if movement_y < 0:
                     entity_rect.top = tile_rect.bottom
-                    self.collision_flags['up'] = True
+                    collision_flags['up'] = True
                 # set the entity's position to the adjusted position of the entity's rect
                 self.pos[1] = entity_rect.y
 
@@ -106,20 +127,48 @@ class PhysicsEntity:
         self.velocity[1] = min(5, self.velocity[1] + 0.1)
 
         # check if the entity is colliding with the ground or the ceiling
-        if self.collision_flags['up'] or self.collision_flags['down']:
+        if collision_flags['up'] or collision_flags['down']:
             # if so set the y velocity to 0 to stop the entity from moving in the y direction
             self.velocity[1] = 0
         self.animation.update()
 
+    # define a method to get the state of the entity as a dictionary, used by replay snapshots
+    def get_state(self):
+        return {
+            'pos': list(self.pos),
+            'velocity': list(self.velocity),
+            'collision_flags': dict(self.collision_flags),
+            'last_movement': tuple(self.last_movement),
+            'flip': self.flip,
+            'action': self.action,
+            'frame': self.animation.current_frame,
+            'done': self.animation.done,
+        }
+
+    # define a method to restore the state of the entity from get_state()
+    def set_state(self, state):
+        self.pos = list(state['pos'])
+        self.velocity = list(state['velocity'])
+        self.collision_flags.update(state['collision_flags'])
+        self.last_movement = state['last_movement']
+        self.flip = state['flip']
+        # restart the animation of the action, then move it to the saved frame
+        self.action = ''
+        self.set_action(state['action'])
+        self.animation.current_frame = state['frame']
+        self.animation.done = state['done']
+
     # define a method to render the entity
     def render(self, surface, offset=(0, 0)):
         # blit the entity's image to the screen at the entity's position
         # if the entity is facing left, flip the image horizontally else render the image normally
         # blit the entity at the position with the animation offset and the camera offset taken into account
-        surface.blit(pygame.transform.flip(self.animation.img(), self.flip, False), (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
+        surface.blit(self.animation.img(self.flip), (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
 
 # define the Player class that inherits from the PhysicsEntity class
 class Player(PhysicsEntity):
+    __slots__ = ('air_time', 'jumps', 'wall_slide', 'dashing')
+
     # define the constructor with the game, position, and size as parameters
     def __init__(self, game, pos, size):
         # call the constructor of the parent class
@@ -132,8 +181,8 @@ class Player(PhysicsEntity):
     
     # define the update method to update the player's position
     def update(self, tilemap, movement=(0, 0)):
-        # call the update method of the parent class
-        super().update(tilemap, movement=movement)
+        # call the update method of the parent class, named directly since super() creates an object on every call
+        PhysicsEntity.update(self, tilemap, movement=movement)
  
         self.air_time += 1
 
@@ -168,12 +217,14 @@ class Player(PhysicsEntity):
                 # if the player is not moving in the x direction and not in the air set the player's action to idle
                 self.set_action('idle')
 
+        # the dash particles draw from the effects random stream of the game
+        rng = self.game.rng['effects']
         if abs(self.dashing) in {60, 50}:
             for i in range(20):
-                angle = random.random() * math.pi * 2
-                speed = random.random() * 0.5 + 0.5
+                angle = rng.random() * math.pi * 2
+                speed = rng.random() * 0.5 + 0.5
                 particle_velocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=particle_velocity, frame=random.randint(0, 7)))
+                self.game.particles.add('particle', self.rect().center, velocity=particle_velocity, frame=rng.randint(0, 7))
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)
         if self.dashing < 0:
@@ -182,14 +233,26 @@ class Player(PhysicsEntity):
             self.velocity[0] = abs(self.dashing) / self.dashing * 8
             if abs(self.dashing) == 51:
                 self.velocity[0] *= 0.1
-            particle_velocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-            self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=particle_velocity, frame=random.randint(0, 7)))
+            particle_velocity = [abs(self.dashing) / self.dashing * rng.random() * 3, 0]
+            self.game.particles.add('particle', self.rect().center, velocity=particle_velocity, frame=rng.randint(0, 7))
 
         if self.velocity[0] > 0:
             self.velocity[0] = max(self.velocity[0] - 0.1, 0)
         else:
             self.velocity[0] = min(self.velocity[0] + 0.1, 0)
 
+    def get_state(self):
+        state = super().get_state()
+        state.update({'air_time': self.air_time, 'jumps': self.jumps, 'wall_slide': self.wall_slide, 'dashing': self.dashing})
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.air_time = state['air_time']
+        self.jumps = state['jumps']
+        self.wall_slide = state['wall_slide']
+        self.dashing = state['dashing']
+
     def render(self, surface, offset=(0, 0)):
         if abs(self.dashing) <= 50:
             super().render(surface, offset=offset)
@@ -223,14 +286,22 @@ class Player(PhysicsEntity):
                 self.dashing = 60
 
 class Enemy(PhysicsEntity):
-    def __init__(self, game, pos, size):
+    __slots__ = ('walking', 'rng')
+
+    # rng is the random number generator of the enemy, every enemy has its own so its decisions do not depend on which other enemies are awake
+    def __init__(self, game, pos, size, rng=None):
         super().__init__(game, 'enemy', pos, size)
         
         self.walking = 0
+        self.rng = rng if rng is not None else random.Random()
 
     def update(self, tilemap, movement=(0, 0)):
+        # the enemy decides and makes the sparks of its shots with its own random stream
+        rng = self.rng
+        # the rect stays where the enemy is until it moves at the end of the method
+        rect = self.rect()
         if self.walking:
-            if tilemap.check_solid((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
+            if tilemap.check_solid((rect.centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
                 if (self.collision_flags['right'] or self.collision_flags['left']):
                     self.flip = not self.flip
                 else:
@@ -239,45 +310,60 @@ class Enemy(PhysicsEntity):
                 self.flip = not self.flip
             self.walking = max(0, self.walking - 1)
             if not self.walking:
-                distance = (self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
-                if (abs(distance[1]) < 16):
-                    if (self.flip and distance[0] < 0):
-                        self.game.projectiles.append([[self.rect().centerx - 6, self.rect().centery], -1.5, 0])
+                distance_x = self.game.player.pos[0] - self.pos[0]
+                if abs(self.game.player.pos[1] - self.pos[1]) < 16:
+                    if (self.flip and distance_x < 0):
+                        projectile_pos = (rect.centerx - 6, rect.centery)
+                        self.game.projectiles.add(projectile_pos, -1.5)
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5 + math.pi, 2 + random.random()))
-                    if (not self.flip and distance[0] > 0):
-                        self.game.projectiles.append([[self.rect().centerx + 6, self.rect().centery], 1.5, 0])
+                            self.game.sparks.add(projectile_pos, rng.random() - 0.5 + math.pi, 2 + rng.random())
+                    if (not self.flip and distance_x > 0):
+                        projectile_pos = (rect.centerx + 6, rect.centery)
+                        self.game.projectiles.add(projectile_pos, 1.5)
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5, 2 + random.random()))
+                            self.game.sparks.add(projectile_pos, rng.random() - 0.5, 2 + rng.random())
 
-        elif random.random() < 0.01:
-            self.walking = random.randint(30, 120)
+        elif rng.random() < 0.01:
+            self.walking = rng.randint(30, 120)
 
-        super().update(tilemap, movement=movement)
+        PhysicsEntity.update(self, tilemap, movement=movement)
 
         if movement[0] != 0:
             self.set_action('run')
         else:
             self.set_action('idle')
 
-        if abs(self.game.player.dashing) >= 46:
-            if self.rect().colliderect(self.game.player.rect()):
-                for i in range(25):
-                    angle = random.random() * math.pi * 2
-                    speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, angle=angle, speed=random.random() * 3))
-                    # self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
-                    self.game.sparks.append(Spark(self.rect().center, 0, 4 + random.random()))
-                    self.game.sparks.append(Spark(self.rect().center, math.pi, 4 + random.random()))
-                return True 
+    def get_state(self):
+        state = super().get_state()
+        state['walking'] = self.walking
+        state['rng'] = self.rng.getstate()
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.walking = state['walking']
+        self.rng.setstate(state['rng'])
+
+    # define a method to burst the enemy into sparks when the dashing player hits it
+    # the hit test itself goes through the broadphase of the game, see Game.update
+    def dash_kill(self):
+        rng = self.game.rng['effects']
+        for i in range(25):
+            angle = rng.random() * math.pi * 2
+            speed = rng.random() * 5
+            self.game.sparks.add(self.rect().center, angle=angle, speed=rng.random() * 3)
+            # self.game.particles.add('particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=rng.randint(0, 7))
+            self.game.sparks.add(self.rect().center, 0, 4 + rng.random())
+            self.game.sparks.add(self.rect().center, math.pi, 4 + rng.random())
 
     def render(self, surface, offset=(0, 0)):
         super().render(surface, offset=offset)
 
+        rect = self.rect()
         if self.flip:
-            surface.blit(pygame.transform.flip(self.game.assets['gun'], True, False), (self.rect().centerx - 3 - self.game.assets['gun'].get_width() - offset[0], self.rect().centery - offset[1]))
+            surface.blit(self.game.assets['gun/flipped'], (rect.centerx - 3 - self.game.assets['gun'].get_width() - offset[0], rect.centery - offset[1]))
         else:
-            surface.blit(self.game.assets['gun'], (self.rect().centerx + 3 - offset[0], self.rect().centery - offset[1]))
+            surface.blit(self.game.assets['gun'], (rect.centerx + 3 - offset[0], rect.centery - offset[1]))
             pass
 
 
@@ -0,0 +1,38 @@
+# inputs module contains the ScriptedInput class, a source of input events that replaces the keyboard,
+# used to drive the game without a player (headless simulations, benchmarks and soak tests).
+import random
+import pygame
+
+# define the keys the game reacts to
+GAME_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_x)
+
+# define the ScriptedInput class
+class ScriptedInput:
+    # define the constructor, script is a list of (tick, event type, key) entries
+    def __init__(self, script=()):
+        # create a dictionary mapping each tick to the events handled before it
+        self.script = {}
+        for tick, event_type, key in script:
+            self.script.setdefault(tick, []).append(pygame.event.Event(event_type, key=key))
+
+    # define a method to get the events to handle before a tick
+    def events(self, tick):
+        return self.script.get(tick, ())
+
+    # define a method to create a script of random play: walking left and right for a while, jumping and dashing
+    @classmethod
+    def random(cls, ticks, seed=None):
+        rng = random.Random(seed)
+        script = []
+        tick = 0
+        while tick < ticks:
+            # hold a direction for a while
+            key = rng.choice((pygame.K_LEFT, pygame.K_RIGHT))
+            hold = rng.randint(10, 90)
+            script.append((tick, pygame.KEYDOWN, key))
+            # jump and dash a few times while moving
+            for i in range(rng.randint(0, 3)):
+                script.append((tick + rng.randint(0, hold), pygame.KEYDOWN, rng.choice((pygame.K_UP, pygame.K_UP, pygame.K_x))))
+            script.append((tick + hold, pygame.KEYUP, key))
+            tick += hold + rng.randint(0, 20)
+        return cls(script)
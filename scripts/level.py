@@ -0,0 +1,80 @@
+# level module contains the LevelTemplate class, the parsed and extracted content of a level file kept in memory,
+# and the LevelCache class, which keeps one template per level file and can build templates on a background thread.
+# loading a level from its template skips reading, parsing and extracting the map file, so respawning and switching levels is instant.
+import threading
+from scripts.tilemap import Tilemap
+
+# define the LevelTemplate class, it is never changed once built
+class LevelTemplate:
+    def __init__(self, tilemap, leaf_spawners, player_pos, enemy_positions):
+        # store the tilemap snapshot taken after the spawners were extracted
+        self.tilemap = tilemap
+        # store the leaf spawner rects as (x, y, width, height) tuples
+        self.leaf_spawners = leaf_spawners
+        # store the position of the player spawner, or None if the level has none
+        self.player_pos = player_pos
+        # store the positions of the enemy spawners in the order they are spawned
+        self.enemy_positions = enemy_positions
+
+    # define a class method to build a template from a map file, JSON or binary
+    # it does not need the game or a display, so it can run on any thread
+    @classmethod
+    def load(cls, path):
+        tilemap = Tilemap(None)
+        tilemap.load(path)
+        leaf_spawners = tuple((4 + tree['pos'][0], tree['pos'][1], 23, 13) for tree in tilemap.extract([('large_decor', 2)], keep=True))
+        player_pos = None
+        enemy_positions = []
+        for spawner in tilemap.extract([('spawners', 0), ('spawners', 1)]):
+            if spawner['variant'] == 0:
+                player_pos = tuple(spawner['pos'])
+            else:
+                enemy_positions.append(tuple(spawner['pos']))
+        return cls(tilemap.snapshot(), leaf_spawners, player_pos, tuple(enemy_positions))
+
+# define the LevelCache class, mapping level file paths to their templates
+# files are read once, so a level file changed on disk after it was cached is not picked up
+class LevelCache:
+    def __init__(self):
+        self.templates = {}
+        # create a dictionary of the threads building templates in the background, keyed by path
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    # define a method to get the template of a level file, waiting for its background load or loading it now
+    def get(self, path):
+        with self.lock:
+            thread = self.pending.pop(path, None)
+        if thread:
+            thread.join()
+        with self.lock:
+            if path in self.templates:
+                return self.templates[path]
+        template = LevelTemplate.load(path)
+        with self.lock:
+            self.templates[path] = template
+        return template
+
+    # define a method to start building the template of a level file on a background thread, if it is not cached yet
+    def preload(self, path):
+        with self.lock:
+            if path in self.templates or path in self.pending:
+                return
+            thread = threading.Thread(target=self.build, args=(path,), daemon=True)
+            self.pending[path] = thread
+        thread.start()
+
+    # define the method the background threads run
+    def build(self, path):
+        try:
+            template = LevelTemplate.load(path)
+        except Exception:
+            # a broken file is reported when the level is actually loaded with get()
+            return
+        with self.lock:
+            self.templates[path] = template
+
+    # define a method to forget every cached template
+    def clear(self):
+        with self.lock:
+            self.templates = {}
@@ -0,0 +1,111 @@
+# mapformat module reads and writes the binary level format, a compact alternative to the JSON map files.
+# the loader reads each section straight into NumPy arrays and hands them to the tilemap, without a Python object per tile.
+#
+# file layout (little endian), version 1:
+#   header: magic 'NDMP' | version (uint16) | tile size (uint16) | number of tile types (uint16)
+#   type table: for every type, its name length (uint8) and UTF-8 name, the first type has id 1
+#   grid section: number of tiles (uint32), then one record per tile: x, y (int32 tile position), type id, variant (uint8)
+#   offgrid section: number of tiles (uint32), then one record per tile: x, y (float64 pixel position), type id, variant (uint8)
+#
+# convert maps with: python -m scripts.mapformat data/maps/0.json data/maps/0.ndmap (or the other way round)
+import argparse
+import struct
+import numpy as np
+
+# define the file extension of binary maps
+MAP_EXTENSION = '.ndmap'
+MAP_MAGIC = b'NDMP'
+MAP_VERSION = 1
+HEADER = struct.Struct('<4sHHH')
+COUNT = struct.Struct('<I')
+GRID_RECORD = np.dtype([('x', '<i4'), ('y', '<i4'), ('type', 'u1'), ('variant', 'u1')])
+OFFGRID_RECORD = np.dtype([('x', '<f8'), ('y', '<f8'), ('type', 'u1'), ('variant', 'u1')])
+# define the largest type id and variant the records can hold
+MAX_RECORD_VALUE = 255
+
+# define a function to check if a file is a binary map
+def is_binary_map(path):
+    file = open(path, 'rb')
+    magic = file.read(len(MAP_MAGIC))
+    file.close()
+    return magic == MAP_MAGIC
+
+# define a function to write a tilemap to a binary map file
+def write_map(tilemap, path):
+    # the grid type ids of the tilemap are kept, the offgrid only types are added after them
+    names = tilemap.tile_types[1:]
+    offgrid_tiles = list(tilemap.offgrid_tiles.values())
+    for tile in offgrid_tiles:
+        if tile['type'] not in names:
+            names.append(tile['type'])
+    # the records store type ids and variants as uint8, a larger value would wrap and corrupt the saved map
+    if len(names) > MAX_RECORD_VALUE:
+        raise ValueError('%d tile types do not fit the binary map format, the limit is %d' % (len(names), MAX_RECORD_VALUE))
+    for name in names:
+        if len(name.encode('utf-8')) > MAX_RECORD_VALUE:
+            raise ValueError('tile type name %r is longer than %d bytes' % (name, MAX_RECORD_VALUE))
+    for tile in offgrid_tiles:
+        if not 0 <= tile['variant'] <= MAX_RECORD_VALUE:
+            raise ValueError('offgrid tile at %s has variant %s, the binary map format holds variants from 0 to %d' % (tile['pos'], tile['variant'], MAX_RECORD_VALUE))
+    name_ids = {name: i + 1 for i, name in enumerate(names)}
+
+    cells = np.argwhere(tilemap.grid_types)
+    grid = np.zeros(len(cells), dtype=GRID_RECORD)
+    grid['x'] = cells[:, 0] + tilemap.origin[0]
+    grid['y'] = cells[:, 1] + tilemap.origin[1]
+    grid['type'] = tilemap.grid_types[cells[:, 0], cells[:, 1]]
+    grid['variant'] = tilemap.grid_variants[cells[:, 0], cells[:, 1]]
+
+    offgrid = np.zeros(len(offgrid_tiles), dtype=OFFGRID_RECORD)
+    offgrid['x'] = [tile['pos'][0] for tile in offgrid_tiles]
+    offgrid['y'] = [tile['pos'][1] for tile in offgrid_tiles]
+    offgrid['type'] = [name_ids[tile['type']] for tile in offgrid_tiles]
+    offgrid['variant'] = [tile['variant'] for tile in offgrid_tiles]
+
+    file = open(path, 'wb')
+    file.write(HEADER.pack(MAP_MAGIC, MAP_VERSION, tilemap.tile_size, len(names)))
+    for name in names:
+        encoded = name.encode('utf-8')
+        file.write(bytes((len(encoded),)) + encoded)
+    file.write(COUNT.pack(len(grid)))
+    file.write(grid.tobytes())
+    file.write(COUNT.pack(len(offgrid)))
+    file.write(offgrid.tobytes())
+    file.close()
+
+# define a function to read a binary map file into a tilemap, replacing its tiles
+def read_map(tilemap, path):
+    file = open(path, 'rb')
+    magic, version, tile_size, type_count = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAP_MAGIC or version != MAP_VERSION:
+        file.close()
+        raise ValueError('unsupported map file: ' + path)
+    names = []
+    for i in range(type_count):
+        length = file.read(1)[0]
+        names.append(file.read(length).decode('utf-8'))
+
+    tilemap.clear(tile_size)
+    # map the type ids of the file to the type ids of the tilemap, id 0 stays empty
+    ids = np.array([0] + [tilemap.type_id(name) for name in names], dtype=np.uint8)
+
+    count = COUNT.unpack(file.read(COUNT.size))[0]
+    grid = np.frombuffer(file.read(count * GRID_RECORD.itemsize), dtype=GRID_RECORD)
+    tilemap.place_tiles(grid['x'].astype(np.int64), grid['y'].astype(np.int64), ids[grid['type']], grid['variant'])
+
+    count = COUNT.unpack(file.read(COUNT.size))[0]
+    offgrid = np.frombuffer(file.read(count * OFFGRID_RECORD.itemsize), dtype=OFFGRID_RECORD)
+    file.close()
+    tilemap.set_offgrid([{'type': names[type_id - 1], 'variant': variant, 'pos': [x, y]} for x, y, type_id, variant in offgrid.tolist()])
+
+if __name__ == '__main__':
+    from scripts.tilemap import Tilemap
+    parser = argparse.ArgumentParser(description='convert maps between the JSON and the binary format')
+    parser.add_argument('source', help='map to read, JSON or binary')
+    parser.add_argument('target', help='map to write, binary if it ends with ' + MAP_EXTENSION + ', JSON otherwise')
+    args = parser.parse_args()
+
+    # the tilemap only needs the game to render, so none is given
+    tilemap = Tilemap(None)
+    tilemap.load(args.source)
+    tilemap.save(args.target)
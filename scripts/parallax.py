@@ -0,0 +1,56 @@
+# parallax module contains the ParallaxLayer class, an image repeated in both directions that scrolls at a fraction of the camera
+# and drifts on its own, and the Parallax class, which composites a stack of layers from back to front.
+# a layer bakes its image once into a strip one screen larger than the image in each direction, holding the image repeated,
+# so any screen sized window of the repeated image is a single rect of the strip and a layer is drawn with one blit,
+# whatever is painted on its image.
+import pygame
+
+# define the ParallaxLayer class
+class ParallaxLayer:
+    # tile is the image the layer repeats, depth the fraction of the camera movement the layer follows
+    # and speed the number of pixels the layer drifts right every update
+    def __init__(self, tile, depth=0, speed=0):
+        self.tile = tile
+        self.depth = depth
+        self.speed = speed
+        self.drift = 0
+        # the strip is baked on the first render, for the size of the surface the layer is drawn on
+        self.strip = None
+
+    def update(self):
+        self.drift += self.speed
+
+    # define a method to bake the strip for a screen size
+    def bake(self, size):
+        tile_width, tile_height = self.tile.get_size()
+        self.strip = pygame.Surface((tile_width + size[0], tile_height + size[1]))
+        colorkey = self.tile.get_colorkey()
+        if colorkey:
+            self.strip.fill(colorkey)
+        for x in range(0, self.strip.get_width(), tile_width):
+            for y in range(0, self.strip.get_height(), tile_height):
+                self.strip.blit(self.tile, (x, y))
+        if colorkey:
+            # layers are mostly see-through, run-length encoding skips the transparent runs when blitting
+            self.strip.set_colorkey(colorkey, pygame.RLEACCEL)
+
+    def render(self, surface, offset=(0, 0)):
+        size = surface.get_size()
+        if not self.strip or self.strip.get_width() - self.tile.get_width() != size[0] or self.strip.get_height() - self.tile.get_height() != size[1]:
+            self.bake(size)
+        x = int(offset[0] * self.depth - self.drift) % self.tile.get_width()
+        y = int(offset[1] * self.depth) % self.tile.get_height()
+        surface.blit(self.strip, (0, 0), (x, y, size[0], size[1]))
+
+# define the Parallax class, the layers are drawn in list order, the first one at the back
+class Parallax:
+    def __init__(self, layers=()):
+        self.layers = list(layers)
+
+    def update(self):
+        for layer in self.layers:
+            layer.update()
+
+    def render(self, surface, offset=(0, 0)):
+        for layer in self.layers:
+            layer.render(surface, offset=offset)
@@ -1,25 +1,121 @@
-import pygame
+import math
+import numpy as np
 
-class Particle:
-    def __init__(self, game, particle_type, pos, velocity=[0, 0], frame=0):
+# define the number of particle slots allocated up front, the pool doubles its size when it runs out
+INITIAL_CAPACITY = 1024
+# define the horizontal sway applied to leaf particles each frame, scaled by the sine of their spawn frame
+LEAF_SWAY = 0.33
+
+# define the Particles class, a pool storing every particle of the game in preallocated arrays
+# particles are kept in spawn order in the first `count` slots, so they render in the same order they were added
+class Particles:
+    def __init__(self, game, capacity=INITIAL_CAPACITY):
         self.game = game
-        self.type = particle_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particles/' + particle_type].copy()
-        self.animation.frame = frame
+        # build the tables describing each particle type from the particle animations in the game assets
+        self.type_ids = {}
+        self.imgs = []
+        frame_base = []
+        self.frame_duration = []
+        self.lifetime = []
+        for key in sorted(self.game.assets):
+            if key.startswith('particles/'):
+                animation = self.game.assets[key]
+                self.type_ids[key[len('particles/'):]] = len(self.type_ids)
+                frame_base.append(len(self.imgs))
+                self.imgs += animation.frames
+                self.frame_duration.append(animation.frame_duration)
+                # a particle lives until its animation has played through once
+                self.lifetime.append(animation.frame_duration * len(animation.frames))
+        self.frame_base = np.array(frame_base, dtype=np.int32)
+        self.frame_duration = np.array(self.frame_duration, dtype=np.int32)
+        self.lifetime = np.array(self.lifetime, dtype=np.int32)
+        # store half the size of every image so particles can be centered on their position
+        self.half_sizes = np.array([(img.get_width() // 2, img.get_height() // 2) for img in self.imgs], dtype=np.float64).reshape(-1, 2)
+        self.leaf_id = self.type_ids.get('leaf', -1)
 
-    def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        self.count = 0
+        self.allocate(capacity)
+
+    # define a method to (re)allocate the arrays with a new capacity, keeping the live particles
+    def allocate(self, capacity):
+        old = (self.types, self.pos, self.velocity, self.frame, self.sway) if self.count else None
+        self.types = np.zeros(capacity, dtype=np.int32)
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float64)
+        # store how many frames each particle has been updated for
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        # store the per frame sway of every particle, only leaves sway
+        self.sway = np.zeros(capacity, dtype=np.float64)
+        if old:
+            for new_array, old_array in zip((self.types, self.pos, self.velocity, self.frame, self.sway), old):
+                new_array[:self.count] = old_array[:self.count]
+
+    def __len__(self):
+        return self.count
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
-        self.animation.update()
+    # define a method to spawn a particle, frame only sets the sway of leaves, every animation starts at its first frame
+    def add(self, particle_type, pos, velocity=(0, 0), frame=0):
+        if self.count == len(self.types):
+            self.allocate(len(self.types) * 2)
+        i = self.count
+        type_id = self.type_ids[particle_type]
+        self.types[i] = type_id
+        self.pos[i] = pos
+        self.velocity[i] = velocity
+        self.frame[i] = 0
+        self.sway[i] = math.sin(frame * 0.035) * LEAF_SWAY if type_id == self.leaf_id else 0
+        self.count += 1
 
-        return kill
+    # define a method to remove every particle
+    def clear(self):
+        self.count = 0
+
+    # define a method to get a copy of the live particles, used by replay snapshots
+    def get_state(self):
+        n = self.count
+        return {'types': self.types[:n].copy(), 'pos': self.pos[:n].copy(), 'velocity': self.velocity[:n].copy(), 'frame': self.frame[:n].copy(), 'sway': self.sway[:n].copy()}
+
+    # define a method to replace the live particles with the ones of get_state()
+    def set_state(self, state):
+        n = len(state['types'])
+        self.count = 0
+        if n > len(self.types):
+            self.allocate(n)
+        for name in ('types', 'pos', 'velocity', 'frame', 'sway'):
+            getattr(self, name)[:n] = state[name]
+        self.count = n
+
+    # define a method to advance every particle by one frame
+    def update(self):
+        n = self.count
+        types = self.types[:n]
+        frame = self.frame[:n]
+        frame += 1
+        # cull the particles whose animation has finished and compact the survivors to the front of the arrays
+        alive = frame <= self.lifetime[types]
+        if not alive.all():
+            n = int(np.count_nonzero(alive))
+            for array in (self.types, self.pos, self.velocity, self.frame, self.sway):
+                array[:n] = array[:self.count][alive]
+            self.count = n
+        # move every particle along its velocity and sway the leaves
+        self.pos[:n] += self.velocity[:n]
+        self.pos[:n, 0] += self.sway[:n]
 
-    def render(self, surface, offset=(0, 0)):
-        particle_img = self.animation.img()
-        surface.blit(particle_img, (self.pos[0] - offset[0] - particle_img.get_width() // 2, self.pos[1] - offset[1] - particle_img.get_height() // 2))
+    # define a method to render every particle with a single batched blit
+    # if a camera is given, the particles it cannot see are skipped
+    def render(self, surface, offset=(0, 0), camera=None):
+        n = self.count
+        if not n:
+            return
+        types = self.types[:n]
+        # pick the animation frame of every particle, holding the last frame on the final update
+        img_ids = self.frame_base[types] + np.minimum(self.frame[:n], self.lifetime[types] - 1) // self.frame_duration[types]
+        pos = self.pos[:n]
+        if camera:
+            visible = camera.cull(pos, self.half_sizes[img_ids], 'particles')
+            img_ids = img_ids[visible]
+            pos = pos[visible]
+        dest = pos - offset - self.half_sizes[img_ids]
+        imgs = self.imgs
+        surface.blits([(imgs[i], pos) for i, pos in zip(img_ids.tolist(), dest.tolist())], doreturn=False)
@@ -0,0 +1,135 @@
+# profiler module contains the Profiler class, which times the stages of each frame,
+# keeps rolling statistics for every stage, draws them as an overlay and dumps Chrome trace files.
+# stages are timed with begin(name) / end() pairs, which nest, and cost a single attribute check while disabled.
+# timing runs while the overlay is shown or a trace is being recorded, the two are switched independently.
+import json
+from collections import deque
+from time import perf_counter_ns
+import numpy as np
+import pygame
+
+# define how many frames the rolling statistics of each stage cover
+HISTORY = 240
+# define how many trace events are kept for the next dump, older events are dropped first
+TRACE_LIMIT = 200000
+# define the frame budget in milliseconds used to scale the overlay bars
+FRAME_BUDGET = 1000 / 60
+# define the x position of the overlay columns (stage, mean, p95, max)
+COLUMNS = (4, 160, 206, 252)
+# define the stage the overlay draws the histogram of, the number of bins and the height of the histogram in pixels
+HISTOGRAM_STAGE = 'frame'
+HISTOGRAM_BINS = 20
+HISTOGRAM_HEIGHT = 40
+
+# define the Profiler class
+class Profiler:
+    def __init__(self, tracing=False):
+        # keep timing for a trace being recorded, and show the overlay, every timed stage goes to the trace dump
+        self.tracing = tracing
+        self.overlay = False
+        # time the stages, kept equal to overlay or tracing by set_overlay and set_tracing
+        self.enabled = tracing
+        # create a stack of the stages currently being timed, as (name, start time in ns)
+        self.stack = []
+        # create a dictionary mapping each stage to a ring buffer of its last durations in ms
+        self.history = {}
+        self.history_index = {}
+        # create a bounded queue of finished stages as (name, start ns, duration ns) for the trace dump
+        self.trace = deque(maxlen=TRACE_LIMIT)
+        self.font = None
+
+    # define a method to show or hide the overlay
+    def set_overlay(self, overlay):
+        self.overlay = overlay
+        self.update_enabled()
+
+    # define a method to start or stop recording the trace
+    def set_tracing(self, tracing):
+        self.tracing = tracing
+        self.update_enabled()
+
+    # define a method to switch timing on or off to follow the overlay and the trace
+    # both are usually switched in the middle of a frame, so the stages begun before are forgotten,
+    # and the end() calls left over from them find the stack empty instead of closing stages begun later
+    def update_enabled(self):
+        enabled = self.overlay or self.tracing
+        if enabled != self.enabled:
+            self.enabled = enabled
+            self.stack = []
+
+    # define a method to start timing a stage
+    def begin(self, name):
+        if self.enabled:
+            self.stack.append((name, perf_counter_ns()))
+
+    # define a method to stop timing the innermost stage
+    def end(self):
+        if self.enabled and self.stack:
+            end = perf_counter_ns()
+            name, start = self.stack.pop()
+            if name not in self.history:
+                self.history[name] = np.zeros(HISTORY)
+                self.history_index[name] = 0
+            self.history[name][self.history_index[name] % HISTORY] = (end - start) / 1e6
+            self.history_index[name] += 1
+            self.trace.append((name, start, end - start))
+
+    # define a method to get the rolling statistics of every stage in ms, as {name: (mean, p95, max)}
+    def stats(self):
+        stats = {}
+        for name, durations in self.history.items():
+            durations = durations[:min(self.history_index[name], HISTORY)]
+            stats[name] = (float(durations.mean()), float(np.percentile(durations, 95)), float(durations.max()))
+        return stats
+
+    # define a method to get the rolling histogram of a stage, the counts of its last durations in each bin
+    def histogram(self, name, bins=10, limit=FRAME_BUDGET):
+        durations = self.history[name][:min(self.history_index[name], HISTORY)]
+        return np.histogram(np.minimum(durations, limit), bins=bins, range=(0, limit))[0]
+
+    # define a method to forget every recorded timing
+    def reset(self):
+        self.stack = []
+        self.history = {}
+        self.history_index = {}
+        self.trace.clear()
+
+    # define a method to write the recorded stages to a Chrome trace file (chrome://tracing, Perfetto or speedscope)
+    def dump(self, path):
+        events = []
+        for name, start, duration in self.trace:
+            # complete events with microsecond timestamps, nested stages are shown stacked
+            events.append({'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000, 'pid': 0, 'tid': 0})
+        file = open(path, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        file.close()
+
+    # define a method to draw the statistics of every stage with a bar for its mean time relative to the frame budget,
+    # and below them the histogram of the frame times up to the frame budget, longer frames are counted in the last bin
+    def render(self, surface, pos=(4, 4)):
+        if not self.overlay:
+            return
+        if not self.font:
+            self.font = pygame.font.Font(None, 18)
+        lines = sorted(self.stats().items(), key=lambda item: -item[1][0])
+        histogram = HISTOGRAM_STAGE in self.history
+        panel = pygame.Surface((300, 14 * len(lines) + 20 + (HISTOGRAM_HEIGHT + 18 if histogram else 0)))
+        panel.set_alpha(200)
+        surface.blit(panel, pos)
+        header = ('stage', 'mean', 'p95', 'max')
+        for text, x in zip(header, COLUMNS):
+            surface.blit(self.font.render(text, True, (255, 255, 255)), (pos[0] + x, pos[1] + 4))
+        for i, (name, values) in enumerate(lines):
+            y = pos[1] + 18 + i * 14
+            pygame.draw.rect(surface, (195, 27, 47), (pos[0] + 4, y + 2, min(values[0] / FRAME_BUDGET, 1) * 292, 10))
+            for text, x in zip((name,) + tuple('%.2f' % value for value in values), COLUMNS):
+                surface.blit(self.font.render(text, True, (255, 255, 255)), (pos[0] + x, y))
+        if histogram:
+            y = pos[1] + 22 + len(lines) * 14
+            surface.blit(self.font.render('%s histogram, 0 to %.1f ms' % (HISTOGRAM_STAGE, FRAME_BUDGET), True, (255, 255, 255)), (pos[0] + 4, y))
+            counts = self.histogram(HISTOGRAM_STAGE, bins=HISTOGRAM_BINS)
+            bar_width = 292 // HISTOGRAM_BINS
+            bottom = y + 16 + HISTOGRAM_HEIGHT
+            for i, count in enumerate(counts):
+                height = int(count / max(counts.max(), 1) * HISTOGRAM_HEIGHT)
+                pygame.draw.rect(surface, (195, 27, 47), (pos[0] + 4 + i * bar_width, bottom - height, bar_width - 1, height))
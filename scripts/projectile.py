@@ -0,0 +1,106 @@
+import math
+import numpy as np
+
+# define the number of projectile slots allocated up front, the pool doubles its size when every slot is taken
+INITIAL_CAPACITY = 64
+# define how many frames a projectile flies before it disappears
+PROJECTILE_LIFETIME = 360
+
+# define the Projectiles class, a pool of fixed slots storing every projectile of the game in arrays
+# free slots are handed out from a free list, so spawning and removing projectiles never moves the others
+class Projectiles:
+    def __init__(self, game, capacity=INITIAL_CAPACITY):
+        self.game = game
+        self.pos = np.zeros((0, 2), dtype=np.float64)
+        self.direction = np.zeros(0, dtype=np.float64)
+        self.timer = np.zeros(0, dtype=np.int32)
+        self.active = np.zeros(0, dtype=bool)
+        self.free = []
+        self.allocate(capacity)
+
+    # define a method to grow the pool to a new capacity, keeping the slots in use
+    def allocate(self, capacity):
+        old_capacity = len(self.active)
+        self.pos = np.concatenate((self.pos, np.zeros((capacity - old_capacity, 2))))
+        self.direction = np.concatenate((self.direction, np.zeros(capacity - old_capacity)))
+        self.timer = np.concatenate((self.timer, np.zeros(capacity - old_capacity, dtype=np.int32)))
+        self.active = np.concatenate((self.active, np.zeros(capacity - old_capacity, dtype=bool)))
+        # hand out the new slots lowest first
+        self.free += range(capacity - 1, old_capacity - 1, -1)
+
+    def __len__(self):
+        return len(self.active) - len(self.free)
+
+    # define a method to spawn a projectile, direction is its horizontal speed in pixels per frame
+    def add(self, pos, direction):
+        if not self.free:
+            self.allocate(len(self.active) * 2)
+        i = self.free.pop()
+        self.pos[i] = pos
+        self.direction[i] = direction
+        self.timer[i] = 0
+        self.active[i] = True
+
+    # define a method to remove every projectile
+    def clear(self):
+        self.active[:] = False
+        self.free = list(range(len(self.active) - 1, -1, -1))
+
+    # define a method to get a copy of every slot and the free list, used by replay snapshots
+    def get_state(self):
+        return {'pos': self.pos.copy(), 'direction': self.direction.copy(), 'timer': self.timer.copy(), 'active': self.active.copy(), 'free': list(self.free)}
+
+    # define a method to restore the slots and the free list of get_state()
+    def set_state(self, state):
+        self.pos = state['pos'].copy()
+        self.direction = state['direction'].copy()
+        self.timer = state['timer'].copy()
+        self.active = state['active'].copy()
+        self.free = list(state['free'])
+
+    # define a method to release a set of slots back to the free list
+    def remove(self, slots):
+        self.active[slots] = False
+        self.free += slots.tolist()
+
+    # define a method to advance every projectile by one frame
+    # projectiles hitting a solid tile burst into sparks, and the method returns how many projectiles hit the player
+    def update(self, tilemap, player):
+        slots = np.flatnonzero(self.active)
+        if not len(slots):
+            return 0
+        self.pos[slots, 0] += self.direction[slots]
+        self.timer[slots] += 1
+        pos = self.pos[slots]
+
+        # check every projectile against the solid grid at once
+        solid = tilemap.solid_at(pos)
+        rng = self.game.rng['effects']
+        for i in np.flatnonzero(solid).tolist():
+            for _ in range(4):
+                self.game.sparks.add(pos[i], rng.random() - 0.5 + (math.pi if self.direction[slots[i]] > 0 else 0), 2 + rng.random())
+        expired = ~solid & (self.timer[slots] > PROJECTILE_LIFETIME)
+
+        # the player can only be hit while not in the fast part of a dash
+        hits = np.zeros(len(slots), dtype=bool)
+        if abs(player.dashing) < 44:
+            player_rect = player.rect()
+            # truncate the positions the same way Rect.collidepoint does
+            points = pos.astype(np.int64)
+            hits = ~solid & ~expired & (points[:, 0] >= player_rect.left) & (points[:, 0] < player_rect.right) & (points[:, 1] >= player_rect.top) & (points[:, 1] < player_rect.bottom)
+
+        self.remove(slots[solid | expired | hits])
+        return int(np.count_nonzero(hits))
+
+    # define a method to render every projectile with a single batched blit
+    # if a camera is given, the projectiles it cannot see are skipped
+    def render(self, surface, offset=(0, 0), camera=None):
+        slots = np.flatnonzero(self.active)
+        if not len(slots):
+            return
+        img = self.game.assets['projectile']
+        pos = self.pos[slots]
+        if camera:
+            pos = pos[camera.cull(pos, max(img.get_size()) / 2, 'projectiles')]
+        dest = pos - (img.get_width() / 2 + offset[0], img.get_height() / 2 + offset[1])
+        surface.blits([(img, pos) for pos in dest.tolist()], doreturn=False)
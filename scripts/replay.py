@@ -0,0 +1,190 @@
+# replay module contains the InputLog class, a compact log of the game keys pressed and released on each tick,
+# and the Replay class, which pairs the log with the state of the game when recording started.
+# the game draws every random number from seeded per-subsystem streams that are part of its state,
+# so playing the log back from the saved state reproduces the recorded session exactly.
+# while a replay records or plays, a snapshot of the game state is kept every SNAPSHOT_INTERVAL ticks, so seeking only replays from the nearest one.
+#
+# file layout (little endian), version 4:
+#   header: magic 'NDRP' | version (uint16) | last tick (uint32) | index size (uint32) | number of events (uint32) | array data size (uint32)
+#   index: JSON list of [tick, state] for the state at the first tick and every snapshot, see encode_state
+#   events: one record per event: tick (uint32), code (uint8) = index of the key in GAME_KEYS * 2 + 1 for a key release
+#   array data: the raw bytes of the arrays of the states, back to back
+# replay files are shared between players, so they hold data only: reading one never runs code from it.
+import json
+import struct
+import numpy as np
+import pygame
+from scripts.inputs import GAME_KEYS
+
+REPLAY_MAGIC = b'NDRP'
+REPLAY_VERSION = 4
+HEADER = struct.Struct('<4sHIIII')
+EVENT_RECORD = np.dtype([('tick', '<u4'), ('code', 'u1')])
+# define how many ticks apart the replay snapshots are
+SNAPSHOT_INTERVAL = 300
+# define the shortest tuple of small integers stored as an array, like the state of a random number generator
+INT_TUPLE_LENGTH = 16
+
+# define a function to turn a game state into values JSON can hold, the arrays are appended to the arrays list
+# and replaced by a reference to them, tuples are tagged so they come back as tuples, which random.Random.setstate requires
+def encode_state(value, arrays):
+    if isinstance(value, dict):
+        return {key: encode_state(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [encode_state(item, arrays) for item in value]
+    if isinstance(value, tuple):
+        # the 625 integers of a random number generator state are stored as an array
+        if len(value) >= INT_TUPLE_LENGTH and all(type(item) is int and 0 <= item < 1 << 32 for item in value):
+            arrays.append(np.array(value, dtype='<u4'))
+            return {'__ints__': len(arrays) - 1}
+        return {'__tuple__': [encode_state(item, arrays) for item in value]}
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value))
+        return {'__array__': len(arrays) - 1}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# define a function to turn the values of encode_state back into a game state, arrays is the list of arrays the references point to
+def decode_state(value, arrays):
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if '__ints__' in value:
+                return tuple(arrays[value['__ints__']].tolist())
+            if '__tuple__' in value:
+                return tuple(decode_state(item, arrays) for item in value['__tuple__'])
+            if '__array__' in value:
+                return arrays[value['__array__']].copy()
+        return {key: decode_state(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_state(item, arrays) for item in value]
+    return value
+
+# define the InputLog class, it can be handed to Game.simulate like a ScriptedInput
+class InputLog:
+    def __init__(self):
+        self.ticks = []
+        self.codes = []
+        # create a dictionary mapping each tick to the events handled before it
+        self.script = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    # define a method to tell if an event is one the log records
+    @staticmethod
+    def records(event):
+        return event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in GAME_KEYS
+
+    # define a method to add an event handled before a tick
+    def record(self, tick, event):
+        self.add(tick, GAME_KEYS.index(event.key) << 1 | (event.type == pygame.KEYUP))
+
+    # define a method to add an event from its code
+    def add(self, tick, code):
+        self.ticks.append(tick)
+        self.codes.append(code)
+        event_type = pygame.KEYUP if code & 1 else pygame.KEYDOWN
+        self.script.setdefault(tick, []).append(pygame.event.Event(event_type, key=GAME_KEYS[code >> 1]))
+
+    # define a method to get the events to handle before a tick
+    def events(self, tick):
+        return self.script.get(tick, ())
+
+    # define a method to get the log as an array of EVENT_RECORD
+    def to_array(self):
+        events = np.zeros(len(self.codes), dtype=EVENT_RECORD)
+        events['tick'] = self.ticks
+        events['code'] = self.codes
+        return events
+
+    # define a class method to build a log from an array of EVENT_RECORD
+    @classmethod
+    def from_array(cls, events):
+        log = cls()
+        for tick, code in events.tolist():
+            log.add(tick, code)
+        return log
+
+# define the Replay class
+class Replay:
+    def __init__(self, state, log=None, end_tick=None):
+        # store the game state the replay starts from, as returned by Game.get_state()
+        self.start_state = state
+        self.log = log if log is not None else InputLog()
+        # store the tick the recording ended on
+        self.end_tick = end_tick if end_tick is not None else state['tick']
+        # create a dictionary of the snapshots taken so far, keyed by tick
+        self.snapshots = {state['tick']: state}
+
+    # define a class method to start recording a game from its current state, the game logs its input and snapshots into the replay
+    @classmethod
+    def record(cls, game):
+        replay = cls(game.get_state())
+        game.recording = replay
+        return replay
+
+    # define a method to write the replay to a file with its snapshots, so seeking a loaded replay starts from the nearest one
+    def save(self, path):
+        arrays = []
+        snapshots = [[tick, encode_state(self.snapshots[tick], arrays)] for tick in sorted(self.snapshots)]
+        # every array is described in the index by its dtype, shape and offset in the array data
+        layout = []
+        offset = 0
+        for array in arrays:
+            layout.append([array.dtype.str, list(array.shape), offset])
+            offset += array.nbytes
+        index = json.dumps({'snapshots': snapshots, 'arrays': layout}).encode('utf-8')
+        events = self.log.to_array()
+        file = open(path, 'wb')
+        file.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.end_tick, len(index), len(events), offset))
+        file.write(index)
+        file.write(events.tobytes())
+        for array in arrays:
+            file.write(array.tobytes())
+        file.close()
+
+    # define a class method to read a replay file
+    @classmethod
+    def load(cls, path):
+        file = open(path, 'rb')
+        data = file.read()
+        file.close()
+        if len(data) < HEADER.size:
+            raise ValueError('unsupported replay file: ' + path)
+        magic, version, end_tick, index_size, count, data_size = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION or len(data) != HEADER.size + index_size + count * EVENT_RECORD.itemsize + data_size:
+            raise ValueError('unsupported replay file: ' + path)
+        index = json.loads(data[HEADER.size:HEADER.size + index_size])
+        events = np.frombuffer(data, dtype=EVENT_RECORD, count=count, offset=HEADER.size + index_size)
+        array_data = memoryview(data)[HEADER.size + index_size + count * EVENT_RECORD.itemsize:]
+        arrays = []
+        for dtype, shape, offset in index['arrays']:
+            dtype = np.dtype(dtype)
+            # only plain numeric arrays are read, and only from inside the array data
+            if dtype.hasobject or offset < 0 or offset + dtype.itemsize * int(np.prod(shape)) > data_size:
+                raise ValueError('broken array in replay file: ' + path)
+            arrays.append(np.frombuffer(array_data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape))
+        snapshots = [(tick, decode_state(state, arrays)) for tick, state in index['snapshots']]
+        replay = cls(snapshots[0][1], InputLog.from_array(events), end_tick)
+        replay.snapshots.update(snapshots)
+        return replay
+
+    # define a method to advance a game by a number of ticks with the logged input, as fast as possible
+    # a snapshot is kept every SNAPSHOT_INTERVAL ticks, the game is rendered if render is True
+    def play(self, game, ticks, render=False):
+        for i in range(ticks):
+            for event in self.log.events(game.tick):
+                game.handle_event(event)
+            game.update()
+            if render:
+                game.render()
+            if not game.tick % SNAPSHOT_INTERVAL and game.tick not in self.snapshots:
+                self.snapshots[game.tick] = game.get_state()
+
+    # define a method to bring a game to the state it had at a tick of the replay, starting from the nearest snapshot before it
+    def seek(self, game, tick):
+        tick = max(tick, self.start_state['tick'])
+        start = max(snapshot_tick for snapshot_tick in self.snapshots if snapshot_tick <= tick)
+        game.set_state(self.snapshots[start])
+        self.play(game, tick - start)
@@ -0,0 +1,68 @@
+# saver module contains the MapSaver class, which saves tilemaps on a background thread so the frame loop never waits for a save.
+# the frame loop only takes a snapshot of the tilemap (a copy of its arrays), the worker thread rebuilds a tilemap from it
+# and writes it with Tilemap.save, which renames a finished temporary file over the map.
+import threading
+from scripts.tilemap import Tilemap
+
+# define the MapSaver class
+class MapSaver:
+    def __init__(self):
+        # store the save waiting for the worker as (snapshot, path), a newer save replaces one that has not started yet
+        self.pending = None
+        self.thread = None
+        self.lock = threading.Lock()
+        # remember the revision of the tilemap at the last save of each path, so unchanged maps are not saved again
+        self.saved_revisions = {}
+
+    # define a method to save a tilemap in the background, it returns False if the map has not changed since its last save
+    def save(self, tilemap, path, force=True):
+        with self.lock:
+            if not force and self.saved_revisions.get(path) == tilemap.revision:
+                return False
+            self.saved_revisions[path] = tilemap.revision
+        snapshot = tilemap.snapshot()
+        with self.lock:
+            self.pending = (snapshot, path)
+            if not self.thread:
+                # the thread is not a daemon, so the program waits for a save in progress before exiting
+                self.thread = threading.Thread(target=self.work)
+                self.thread.start()
+        return True
+
+    # define a method to tell if a save is waiting or being written
+    def busy(self):
+        with self.lock:
+            return self.thread is not None
+
+    # define a method to wait until every save has been written
+    def wait(self):
+        with self.lock:
+            thread = self.thread
+        if thread:
+            thread.join()
+
+    # define the method the worker thread runs, it writes saves until none is pending
+    def work(self):
+        try:
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        # the thread is cleared under the same lock save() checks it with, so no pending save is left behind
+                        self.thread = None
+                        return
+                    snapshot, path = self.pending
+                    self.pending = None
+                try:
+                    tilemap = Tilemap(None)
+                    tilemap.restore(snapshot)
+                    tilemap.save(path)
+                except Exception as error:
+                    print('saving ' + path + ' failed: ' + repr(error))
+                    # forget the revision so the next autosave tries again
+                    with self.lock:
+                        self.saved_revisions.pop(path, None)
+        finally:
+            # the thread is cleared however the worker stopped, so a failed save never blocks the saves after it
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
@@ -1,25 +1,125 @@
 import math
+import numpy as np
 import pygame
 
-class Spark:
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+# define the color of the sparks
+SPARK_COLOR = (195, 27, 47)
+# define the number of spark slots allocated up front, the pool doubles its size when it runs out
+INITIAL_CAPACITY = 256
+# define how finely the direction and speed of a spark are quantized when picking its pre-rendered sprite
+ANGLE_STEPS = 128
+SPEED_STEP = 0.1
 
-    def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+# define a function to get the four corners of spark quads relative to their centers
+# dirs is an (n, 2) array of unit direction vectors and speeds an (n,) array, the result is an (n, 4, 2) array
+def quad_points(dirs, speeds):
+    forward = dirs * (speeds * 3)[:, None]
+    # the side vector is the direction rotated by a quarter turn
+    side = np.stack((-dirs[:, 1], dirs[:, 0]), axis=1) * (speeds * 0.5)[:, None]
+    return np.stack((forward, side, -forward, -side), axis=1)
+
+# define the Sparks class, a pool storing every spark of the game in preallocated arrays
+class Sparks:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self.allocate(capacity)
+        # create a dictionary caching the rendered spark sprites, keyed by the quantized angle and speed
+        self.sprites = {}
+
+    # define a method to (re)allocate the arrays with a new capacity, keeping the live sparks
+    def allocate(self, capacity):
+        old = (self.pos, self.dirs, self.angle_ids, self.speed) if self.count else None
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        # store the unit direction vector of every spark so its angle is never recomputed
+        self.dirs = np.zeros((capacity, 2), dtype=np.float64)
+        # store the quantized angle of every spark, used to pick its sprite
+        self.angle_ids = np.zeros(capacity, dtype=np.int32)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        if old:
+            for new_array, old_array in zip((self.pos, self.dirs, self.angle_ids, self.speed), old):
+                new_array[:self.count] = old_array[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    # define a method to spawn a spark moving at an angle in radians
+    def add(self, pos, angle, speed):
+        if self.count == len(self.speed):
+            self.allocate(len(self.speed) * 2)
+        i = self.count
+        self.pos[i] = pos
+        self.dirs[i] = (math.cos(angle), math.sin(angle))
+        self.angle_ids[i] = round(angle / (math.pi * 2) * ANGLE_STEPS) % ANGLE_STEPS
+        self.speed[i] = speed
+        self.count += 1
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
+    # define a method to remove every spark
+    def clear(self):
+        self.count = 0
+
+    # define a method to get a copy of the live sparks, used by replay snapshots
+    def get_state(self):
+        n = self.count
+        return {'pos': self.pos[:n].copy(), 'dirs': self.dirs[:n].copy(), 'angle_ids': self.angle_ids[:n].copy(), 'speed': self.speed[:n].copy()}
+
+    # define a method to replace the live sparks with the ones of get_state()
+    def set_state(self, state):
+        n = len(state['speed'])
+        self.count = 0
+        if n > len(self.speed):
+            self.allocate(n)
+        for name in ('pos', 'dirs', 'angle_ids', 'speed'):
+            getattr(self, name)[:n] = state[name]
+        self.count = n
+
+    # define a method to advance every spark by one frame
+    def update(self):
+        n = self.count
+        # sparks that stopped on the previous frame have been drawn once as a point and are removed now
+        alive = self.speed[:n] > 0
+        if not alive.all():
+            n = int(np.count_nonzero(alive))
+            for array in (self.pos, self.dirs, self.angle_ids, self.speed):
+                array[:n] = array[:self.count][alive]
+            self.count = n
+        # move every spark along its direction and slow it down
+        self.pos[:n] += self.dirs[:n] * self.speed[:n, None]
+        np.maximum(self.speed[:n] - 0.1, 0, out=self.speed[:n])
 
-    def render(self, surface, offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-        ]
+    # define a method to render the quads of new (angle, speed) keys into sprites, the center of a quad is the middle of its sprite
+    def bake_sprites(self, keys):
+        angles = np.array([key[0] for key in keys]) / ANGLE_STEPS * math.pi * 2
+        speeds = np.array([key[1] for key in keys]) * SPEED_STEP
+        # build the corners of every new quad in one go
+        points = quad_points(np.stack((np.cos(angles), np.sin(angles)), axis=1), speeds)
+        halves = np.ceil(speeds * 3).astype(np.int32) + 1
+        points += halves[:, None, None]
+        for key, quad, half in zip(keys, points.tolist(), halves.tolist()):
+            sprite = pygame.Surface((half * 2 + 1, half * 2 + 1))
+            pygame.draw.polygon(sprite, SPARK_COLOR, quad)
+            sprite.set_colorkey((0, 0, 0))
+            self.sprites[key] = (sprite, half)
 
-        pygame.draw.polygon(surface, (195,27,47), render_points)
+    # define a method to render every spark with a single batched blit of cached sprites
+    # if a camera is given, the sparks it cannot see are skipped
+    def render(self, surface, offset=(0, 0), camera=None):
+        n = self.count
+        if not n:
+            return
+        pos = self.pos[:n]
+        angle_ids = self.angle_ids[:n]
+        speed = self.speed[:n]
+        if camera:
+            # the tip of a spark is its speed times 3 away from its center
+            visible = camera.cull(pos, speed * 3 + 1, 'sparks')
+            pos, angle_ids, speed = pos[visible], angle_ids[visible], speed[visible]
+        keys = list(zip(angle_ids.tolist(), np.round(speed / SPEED_STEP).astype(np.int32).tolist()))
+        missing = set(keys).difference(self.sprites)
+        if missing:
+            self.bake_sprites(list(missing))
+        sprites = self.sprites
+        blits = []
+        for key, dest in zip(keys, (pos - offset).tolist()):
+            sprite, half = sprites[key]
+            blits.append((sprite, (dest[0] - half, dest[1] - half)))
+        surface.blits(blits, doreturn=False)
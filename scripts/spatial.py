@@ -0,0 +1,77 @@
+# spatial module contains the SpatialHash class, a uniform grid of buckets used to find the items overlapping a rect or a point
+# without testing every item. an item is stored in every bucket its rect touches, so a query only looks at the buckets it covers
+# and its cost grows with the number of items found, not with the number of items stored.
+import pygame
+
+# define the SpatialHash class
+class SpatialHash:
+    def __init__(self, cell_size):
+        # store the size of a bucket in pixels
+        self.cell_size = cell_size
+        # create a dictionary mapping each bucket location to the set of keys stored in it
+        self.cells = {}
+        # create dictionaries mapping each key to its rect and to the range of buckets it is stored in
+        self.rects = {}
+        self.ranges = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    # define a method to get the range of bucket locations a rect covers, as (x0, y0, x1, y1) inclusive
+    def cell_range(self, rect):
+        return (int(rect[0] // self.cell_size), int(rect[1] // self.cell_size),
+                int((rect[0] + max(rect[2], 1) - 1) // self.cell_size), int((rect[1] + max(rect[3], 1) - 1) // self.cell_size))
+
+    # define a method to store a key with its rect, or move it if the key is already stored
+    # moving a key within its buckets only updates the stored rect, so entities can be moved every tick cheaply
+    def insert(self, key, rect):
+        cell_range = self.cell_range(rect)
+        if key in self.rects:
+            if self.ranges[key] == cell_range:
+                self.rects[key].update(rect)
+                return
+            self.remove(key)
+        self.rects[key] = pygame.Rect(rect)
+        self.ranges[key] = cell_range
+        x0, y0, x1, y1 = cell_range
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if (x, y) not in self.cells:
+                    self.cells[(x, y)] = set()
+                self.cells[(x, y)].add(key)
+
+    # define a method to remove a key, if it is stored
+    def remove(self, key):
+        if self.rects.pop(key, None) is None:
+            return
+        x0, y0, x1, y1 = self.ranges.pop(key)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cell = self.cells[(x, y)]
+                cell.discard(key)
+                # drop empty buckets so the dictionary only holds occupied ones
+                if not cell:
+                    del self.cells[(x, y)]
+
+    # define a method to remove every key
+    def clear(self):
+        self.cells = {}
+        self.rects = {}
+        self.ranges = {}
+
+    # define a method to get the set of keys whose rect overlaps a rect
+    def query(self, rect):
+        x0, y0, x1, y1 = self.cell_range(rect)
+        candidates = set()
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if (x, y) in self.cells:
+                    candidates |= self.cells[(x, y)]
+        return {key for key in candidates if self.rects[key].colliderect(rect)}
+
+    # define a method to get the set of keys whose rect contains a point
+    def query_point(self, pos):
+        cell = self.cells.get((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)))
+        if not cell:
+            return set()
+        return {key for key in cell if self.rects[key].collidepoint(pos)}
@@ -1,8 +1,14 @@
 # This file contains the Tilemap class, which is used to render the tilemap of the game.
 # it also contains methods to get the neighboring tiles and their rects for collision detection.
 # collision detection with the player entity is done in the PhysicsEntity class.
+import os
+import math
 import pygame
 import json
+import numpy as np
+from scripts import mapformat
+from scripts.spatial import SpatialHash
+from collections import OrderedDict
 
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
@@ -21,112 +27,683 @@ NEIGHBORING_OFFSET = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1,
 # define the collidable tiles set containing the tile types that the player can collide with
 COLLIDABLE_TILES = {'grass', 'stone'}
 AUTOTILABLE_TILES = {'grass', 'stone'}
+# define the neighbors an autotile bitmask is built from, the bit of each neighbor is 1 << its index
+AUTOTILE_BITS = ((1, 0), (-1, 0), (0, -1), (0, 1))
+# define a lookup table from a neighbor bitmask to the variant AUTOTILE_MAP gives it, -1 where the map has no variant
+AUTOTILE_LUT = np.full(1 << len(AUTOTILE_BITS), -1, dtype=np.int16)
+for neighbors, variant in AUTOTILE_MAP.items():
+    AUTOTILE_LUT[sum(1 << AUTOTILE_BITS.index(shift) for shift in neighbors)] = variant
+# define the size of a render chunk in tiles, every chunk is baked once into a single surface and reused each frame
+CHUNK_SIZE = 8
+# define how many tiles to look back when baking a chunk, so grid tiles with images larger than a tile are not cut off
+CHUNK_MARGIN = 3
+# define the maximum number of baked chunk surfaces kept in memory, the least recently drawn ones are dropped first
+CHUNK_CACHE_LIMIT = 256
+# define the largest number of empty cells a flood fill covers, a larger empty area is treated as open
+FLOOD_FILL_LIMIT = 4096
+
+# define a function to create the storage of a grid array: a zeroed bytearray with one byte per cell (x * height + y)
+# and a numpy array view of the same memory, indexed by [x, y]
+def cell_buffer(width, height, dtype=np.uint8):
+    cells = bytearray(width * height)
+    return cells, np.frombuffer(cells, dtype=dtype).reshape(width, height)
+
 # define the Tilemap class
 class Tilemap:
     # define the constructor
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        # create a dictionary to store the tilemap
-        self.tilemap = {}
-        # create a list to store the offgrid tiles
-        self.offgrid_tiles = []
+        # create the type table, id 0 is reserved for empty cells so the first type gets id 1
+        self.tile_types = [None]
+        self.type_ids = {}
+        # create the dense arrays storing the type id and variant of every grid cell, indexed by [x, y]
+        # every array is a view of a bytearray with one byte per cell (x * height + y), the bytearrays serve the fast scalar reads
+        self.type_cells, self.grid_types = cell_buffer(0, 0)
+        self.variant_cells, self.grid_variants = cell_buffer(0, 0)
+        # create the collision index marking the solid cells, kept in sync with the type array
+        self.solid_cells, self.solid = cell_buffer(0, 0, bool)
+        # store the shape of the collision index as a tuple, numpy builds a new one every time the shape of an array is read
+        self.solid_shape = (0, 0)
+        # create a lookup array telling which type ids are collidable
+        self.solid_types = np.zeros(256, dtype=bool)
+        # create a dictionary to reuse the collision rect of each solid cell, keyed by its flat index in the collision index
+        self.solid_rects = {}
+        # store the tile position of the cell at index [0, 0] of the arrays
+        self.origin = (0, 0)
+        # create a dictionary to store the offgrid tiles by key, its order is the order they are drawn in
+        self.offgrid_tiles = {}
+        self.offgrid_next_key = 0
+        # create the spatial index of the offgrid tiles, its buckets line up with the render chunks
+        self.offgrid_index = SpatialHash(CHUNK_SIZE * tile_size)
+        # create dictionaries mapping each offgrid tile (by its id) to its key, and each (type, variant) pair to the keys of its tiles
+        self.offgrid_keys = {}
+        self.offgrid_kinds = {}
+        # create an ordered dictionary to cache the baked chunk surfaces, keyed by the chunk location
+        self.chunk_cache = OrderedDict()
+        # count the changes made to the tiles, so savers can tell if anything changed since the last save
+        self.revision = 0
+
+    # define a method to get the integer id of a tile type, registering the type if it is new
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            if len(self.tile_types) > 255:
+                raise ValueError('too many tile types in one tilemap')
+            self.type_ids[tile_type] = len(self.tile_types)
+            self.solid_types[len(self.tile_types)] = tile_type in COLLIDABLE_TILES
+            self.tile_types.append(tile_type)
+        return self.type_ids[tile_type]
+
+    # define a method to grow the arrays so they cover the tile positions from (x0, y0) up to but excluding (x1, y1)
+    def reserve(self, x0, y0, x1, y1):
+        width, height = self.grid_types.shape
+        ox, oy = self.origin
+        if width and height:
+            if x0 >= ox and y0 >= oy and x1 <= ox + width and y1 <= oy + height:
+                return
+            # pad the growing sides by half the current size so painting outwards only reallocates a few times
+            if x0 < ox:
+                x0 -= width // 2
+            if x1 > ox + width:
+                x1 += width // 2
+            if y0 < oy:
+                y0 -= height // 2
+            if y1 > oy + height:
+                y1 += height // 2
+            x0, y0, x1, y1 = min(x0, ox), min(y0, oy), max(x1, ox + width), max(y1, oy + height)
+        # align the bounds to the chunk grid
+        x0, y0 = x0 // CHUNK_SIZE * CHUNK_SIZE, y0 // CHUNK_SIZE * CHUNK_SIZE
+        x1, y1 = -(-x1 // CHUNK_SIZE) * CHUNK_SIZE, -(-y1 // CHUNK_SIZE) * CHUNK_SIZE
+        type_cells, grid_types = cell_buffer(x1 - x0, y1 - y0)
+        variant_cells, grid_variants = cell_buffer(x1 - x0, y1 - y0)
+        solid_cells, solid = cell_buffer(x1 - x0, y1 - y0, bool)
+        grid_types[ox - x0:ox - x0 + width, oy - y0:oy - y0 + height] = self.grid_types
+        grid_variants[ox - x0:ox - x0 + width, oy - y0:oy - y0 + height] = self.grid_variants
+        solid[ox - x0:ox - x0 + width, oy - y0:oy - y0 + height] = self.solid
+        self.type_cells, self.grid_types = type_cells, grid_types
+        self.variant_cells, self.grid_variants = variant_cells, grid_variants
+        self.solid_cells = solid_cells
+        self.solid = solid
+        self.solid_shape = solid.shape
+        self.origin = (x0, y0)
+        # the flat indexes moved with the origin and the shape, so the cached rects are dropped
+        self.solid_rects = {}
+
+    # define a method to get the array index of a tile position, or None if it is outside the arrays
+    def cell_index(self, x, y):
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.grid_types.shape[0] and 0 <= y < self.grid_types.shape[1]:
+            return x, y
+        return None
+
+    # define a method to get the grid tile at a tile position as a dictionary, or None if the cell is empty
+    def get_tile(self, pos):
+        x = pos[0] - self.origin[0]
+        y = pos[1] - self.origin[1]
+        width, height = self.solid_shape
+        if 0 <= x < width and 0 <= y < height:
+            type_id = self.type_cells[x * height + y]
+            if type_id:
+                return {'type': self.tile_types[type_id], 'variant': self.variant_cells[x * height + y], 'pos': [pos[0], pos[1]]}
+        return None
+
+    # define a method to get every grid tile as a dictionary keyed by "x;y", the layout used by the map files
+    def grid_tiles(self):
+        tiles = {}
+        for x, y in np.argwhere(self.grid_types).tolist():
+            pos = [x + self.origin[0], y + self.origin[1]]
+            tiles[str(pos[0]) + ';' + str(pos[1])] = {'type': self.tile_types[self.grid_types[x, y]], 'variant': int(self.grid_variants[x, y]), 'pos': pos}
+        return tiles
 
     # define a method to get the neighboring tiles relative to a specific position
     def tiles_around(self, pos):
         # create an empty list to store the neighboring tiles
         neighboring_tiles = []
-        # get the tile location by dividing the x and y position by the tile size
-        tile_location = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
-        # loop through the neighboring offsets to get the neighboring tiles
+        # get the array index of the tile the position is in
+        ox, oy = self.origin
+        x = int(pos[0] // self.tile_size) - ox
+        y = int(pos[1] // self.tile_size) - oy
+        width, height = self.solid_shape
+        # loop through the neighboring offsets and read the type and variant bytes directly
         for offset in NEIGHBORING_OFFSET:
-            # create a relative tile position by adding the offset to the tile location
-            checked_location = str(tile_location[0] + offset[0]) + ';' + str(tile_location[1] + offset[1])
-            # check if the checked location key is in the tilemap's keys
-            if checked_location in self.tilemap:
-                # append the tile to the neighboring tiles list if it is in the tilemap's keys
-                neighboring_tiles.append(self.tilemap[checked_location])
+            check_x, check_y = x + offset[0], y + offset[1]
+            if 0 <= check_x < width and 0 <= check_y < height:
+                index = check_x * height + check_y
+                type_id = self.type_cells[index]
+                # append the tile if the cell is not empty
+                if type_id:
+                    neighboring_tiles.append({'type': self.tile_types[type_id], 'variant': self.variant_cells[index], 'pos': [check_x + ox, check_y + oy]})
 
         # return the neighboring tiles
         return neighboring_tiles
 
     def extract(self, id_pairs, keep=False):
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
+        # look the offgrid tiles up by kind, sorting the keys keeps the order they were placed in
+        keys = []
+        for id_pair in set(id_pairs):
+            keys += self.offgrid_kinds.get(id_pair, ())
+        for key in sorted(keys):
+            tile = self.offgrid_tiles[key]
+            matches.append(tile.copy())
 
+            if not keep:
+                self.remove_offgrid(tile)
+
+        for tile_type, variant in id_pairs:
+            if tile_type not in self.type_ids:
+                continue
+            mask = (self.grid_types == self.type_ids[tile_type]) & (self.grid_variants == variant)
+            for x, y in np.argwhere(mask).tolist():
+                pos = [x + self.origin[0], y + self.origin[1]]
+                matches.append({'type': tile_type, 'variant': variant, 'pos': [pos[0] * self.tile_size, pos[1] * self.tile_size]})
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
-
-        for location in self.tilemap:
-            tile = self.tilemap[location]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
-                if not keep:
-                    del self.tilemap[location]
+                    self.remove_tile(pos)
         return matches
 
     def save(self, path):
-        file = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, file)
-        file.close()
+        # the map is written to a temporary file next to it and renamed over it, so a crash while writing never leaves a broken map
+        temp_path = path + '.tmp'
+        # paths with the binary map extension are saved in the binary format, see scripts/mapformat.py
+        if path.endswith(mapformat.MAP_EXTENSION):
+            mapformat.write_map(self, temp_path)
+        else:
+            file = open(temp_path, 'w')
+            self.write_json(file)
+            file.close()
+        os.replace(temp_path, path)
+
 
+    # define a method to write the map as JSON, the same text json.dump writes for {'tilemap': grid_tiles(), 'tile_size': ..., 'offgrid': [...]}
+    # the grid is written a block of cells at a time straight from the arrays, without building a dictionary per tile,
+    # so large maps save quickly and a save on a background thread does not stall the frame loop with garbage collection
+    def write_json(self, file):
+        type_names = [json.dumps(tile_type) for tile_type in self.tile_types]
+        cells = np.argwhere(self.grid_types)
+        file.write('{"tilemap": {')
+        for start in range(0, len(cells), 4096):
+            block = cells[start:start + 4096]
+            types = self.grid_types[block[:, 0], block[:, 1]].tolist()
+            variants = self.grid_variants[block[:, 0], block[:, 1]].tolist()
+            xs = (block[:, 0] + self.origin[0]).tolist()
+            ys = (block[:, 1] + self.origin[1]).tolist()
+            if start:
+                file.write(', ')
+            file.write(', '.join('"%d;%d": {"type": %s, "variant": %d, "pos": [%d, %d]}' % (x, y, type_names[type_id], variant, x, y)
+                                 for x, y, type_id, variant in zip(xs, ys, types, variants)))
+        file.write('}, "tile_size": ' + json.dumps(self.tile_size) + ', "offgrid": ' + json.dumps(list(self.offgrid_tiles.values())) + '}')
 
     def check_solid(self, pos):
-        checked_location = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if checked_location in self.tilemap:
-            if self.tilemap[checked_location]['type'] in COLLIDABLE_TILES:
-                return self.tilemap[checked_location]
+        x = int(pos[0] // self.tile_size) - self.origin[0]
+        y = int(pos[1] // self.tile_size) - self.origin[1]
+        width, height = self.solid_shape
+        if 0 <= x < width and 0 <= y < height:
+            return self.solid_cells[x * height + y] == 1
+        return False
+
+    # define a method to check many pixel positions against the collision index at once
+    # points is an (n, 2) array and the result is an (n,) boolean array
+    def solid_at(self, points):
+        cells = np.floor_divide(points, self.tile_size).astype(np.int64) - self.origin
+        width, height = self.solid.shape
+        inside = (cells[:, 0] >= 0) & (cells[:, 0] < width) & (cells[:, 1] >= 0) & (cells[:, 1] < height)
+        result = np.zeros(len(cells), dtype=bool)
+        result[inside] = self.solid[cells[inside, 0], cells[inside, 1]]
+        return result
 
     def load(self, path):
+        # binary maps are recognized by their magic bytes, anything else is read as JSON
+        if mapformat.is_binary_map(path):
+            mapformat.read_map(self, path)
+            return
         file = open(path, 'r')
         loaded_data = json.load(file)
         file.close()
-        self.tilemap = loaded_data['tilemap']
-        self.tile_size = loaded_data['tile_size']
-        self.offgrid_tiles = loaded_data['offgrid']
+        self.clear(loaded_data['tile_size'])
+        self.set_offgrid(loaded_data['offgrid'])
+        tiles = list(loaded_data['tilemap'].values())
+        if tiles:
+            # the grid arrays hold type ids and variants as uint8, a tile that does not fit is reported with its file and position
+            for tile in tiles:
+                if not 0 <= tile['variant'] <= mapformat.MAX_RECORD_VALUE:
+                    raise ValueError('%s: grid tile at %s has variant %s, grid tiles hold variants from 0 to %d' % (path, tile['pos'], tile['variant'], mapformat.MAX_RECORD_VALUE))
+                if tile['type'] not in self.type_ids and len(self.tile_types) > mapformat.MAX_RECORD_VALUE:
+                    raise ValueError('%s: grid tile at %s has type %r, a tilemap holds at most %d grid tile types' % (path, tile['pos'], tile['type'], mapformat.MAX_RECORD_VALUE))
+                self.type_id(tile['type'])
+            xs = np.array([tile['pos'][0] for tile in tiles], dtype=np.int64)
+            ys = np.array([tile['pos'][1] for tile in tiles], dtype=np.int64)
+            type_ids = np.array([self.type_ids[tile['type']] for tile in tiles], dtype=np.uint8)
+            variants = np.array([tile['variant'] for tile in tiles], dtype=np.uint8)
+            self.place_tiles(xs, ys, type_ids, variants)
 
+    # define a method to take a read-only snapshot of every tile, which restore() can bring back later
+    def snapshot(self):
+        grid_types = self.grid_types.copy()
+        grid_variants = self.grid_variants.copy()
+        grid_types.flags.writeable = False
+        grid_variants.flags.writeable = False
+        return {
+            'tile_size': self.tile_size,
+            'tile_types': tuple(self.tile_types[1:]),
+            'origin': self.origin,
+            'grid_types': grid_types,
+            'grid_variants': grid_variants,
+            'offgrid': tuple((tile['type'], tile['variant'], tuple(tile['pos'])) for tile in self.offgrid_tiles.values()),
+        }
+
+    # define a method to replace every tile with the tiles of a snapshot, without reading or parsing a map file
+    def restore(self, snapshot):
+        self.clear(snapshot['tile_size'])
+        for tile_type in snapshot['tile_types']:
+            self.type_id(tile_type)
+        width, height = snapshot['grid_types'].shape
+        self.type_cells, self.grid_types = cell_buffer(width, height)
+        self.variant_cells, self.grid_variants = cell_buffer(width, height)
+        self.solid_cells, self.solid = cell_buffer(width, height, bool)
+        self.grid_types[:] = snapshot['grid_types']
+        self.grid_variants[:] = snapshot['grid_variants']
+        self.solid_shape = (width, height)
+        self.origin = snapshot['origin']
+        self.rebuild_solid()
+        self.set_offgrid([{'type': tile_type, 'variant': variant, 'pos': list(pos)} for tile_type, variant, pos in snapshot['offgrid']])
+
+    # define a method to remove every tile and reset the type table
+    def clear(self, tile_size=None):
+        if tile_size:
+            self.tile_size = tile_size
+        self.offgrid_tiles = {}
+        self.offgrid_next_key = 0
+        self.offgrid_index = SpatialHash(CHUNK_SIZE * self.tile_size)
+        self.offgrid_keys = {}
+        self.offgrid_kinds = {}
+        self.tile_types = [None]
+        self.type_ids = {}
+        self.type_cells, self.grid_types = cell_buffer(0, 0)
+        self.variant_cells, self.grid_variants = cell_buffer(0, 0)
+        self.solid_cells, self.solid = cell_buffer(0, 0, bool)
+        self.solid_shape = (0, 0)
+        self.solid_types[:] = False
+        self.solid_rects = {}
+        self.origin = (0, 0)
+        # drop every baked chunk since the whole map changed
+        self.chunk_cache.clear()
+        self.revision += 1
+
+    # define a method to place many grid tiles at once from arrays of tile positions, type ids and variants
+    def place_tiles(self, xs, ys, type_ids, variants):
+        if not len(xs):
+            return
+        self.reserve(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        self.grid_types[xs - self.origin[0], ys - self.origin[1]] = type_ids
+        self.grid_variants[xs - self.origin[0], ys - self.origin[1]] = variants
+        self.rebuild_solid()
+        self.chunk_cache.clear()
+        self.revision += 1
+
+    # define a method to autotile every grid tile at once
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILABLE_TILES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        xs, ys = np.nonzero(self.grid_types)
+        self.autotile_cells(xs, ys)
+
+    # define a method to autotile only a grid tile and its four neighbors, used after a single tile is painted or erased
+    def autotile_around(self, pos):
+        xs = np.array([pos[0] + shift[0] for shift in ((0, 0),) + AUTOTILE_BITS]) - self.origin[0]
+        ys = np.array([pos[1] + shift[1] for shift in ((0, 0),) + AUTOTILE_BITS]) - self.origin[1]
+        width, height = self.grid_types.shape
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        self.autotile_cells(xs[inside], ys[inside])
+
+    # define a method to autotile a set of cells given as arrays of array indices
+    # the bitmask of every cell is built from its same type neighbors with array operations and looked up in AUTOTILE_LUT
+    def autotile_cells(self, xs, ys):
+        types = self.grid_types[xs, ys]
+        width, height = self.grid_types.shape
+        masks = np.zeros(len(xs), dtype=np.int64)
+        for bit, shift in enumerate(AUTOTILE_BITS):
+            check_x, check_y = xs + shift[0], ys + shift[1]
+            inside = (check_x >= 0) & (check_x < width) & (check_y >= 0) & (check_y < height)
+            same = np.zeros(len(xs), dtype=bool)
+            same[inside] = self.grid_types[check_x[inside], check_y[inside]] == types[inside]
+            masks |= same.astype(np.int64) << bit
+        autotilable = np.array([tile_type in AUTOTILABLE_TILES for tile_type in self.tile_types])
+        variants = AUTOTILE_LUT[masks]
+        changed = autotilable[types] & (variants >= 0) & (variants != self.grid_variants[xs, ys])
+        xs, ys = xs[changed], ys[changed]
+        if not len(xs):
+            return
+        # invalidate the chunks under the old images, then under the new ones
+        self.invalidate_cells(xs, ys)
+        self.grid_variants[xs, ys] = variants[changed]
+        self.invalidate_cells(xs, ys)
+        self.revision += 1
+
+    # define a method to drop the baked chunks of a set of cells given as arrays of array indices
+    def invalidate_cells(self, xs, ys):
+        # past the size of the cache it is cheaper to drop every chunk
+        if len(xs) > CHUNK_CACHE_LIMIT:
+            self.chunk_cache.clear()
+            return
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            self.invalidate_tile(self.get_tile((x + self.origin[0], y + self.origin[1])))
+
+    # define a method to recompute the whole collision index from the type array, used after bulk changes
+    def rebuild_solid(self):
+        self.solid[:] = self.solid_types[self.grid_types]
+        self.solid_rects = {}
 
     # define a method to get the neighboring tiles's rects for collision detection
-    def neighboring_tiles_physics(self, pos):
-        # create an empty list to store the neighboring tile rects
-        rects = []
-        # loop through the neighboring tiles to get the rects
-        for tile in self.tiles_around(pos):
-            # check if the tile type is in the collidable tiles set
-            if tile['type'] in COLLIDABLE_TILES:
-                # append the rect of the tile to the list
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
+    # rects is an optional list to fill instead of a new one, entities pass the same list every tick
+    def neighboring_tiles_physics(self, pos, rects=None):
+        # create an empty list to store the neighboring tile rects, or empty the given one
+        if rects is None:
+            rects = []
+        else:
+            rects.clear()
+        # get the array index of the tile the position is in
+        x = int(pos[0] // self.tile_size) - self.origin[0]
+        y = int(pos[1] // self.tile_size) - self.origin[1]
+        width, height = self.solid_shape
+        # loop through the neighboring offsets and read the collision index directly
+        for offset in NEIGHBORING_OFFSET:
+            check_x, check_y = x + offset[0], y + offset[1]
+            if 0 <= check_x < width and 0 <= check_y < height and self.solid_cells[check_x * height + check_y]:
+                # reuse the rect of the solid cell, creating it the first time the cell is touched
+                # the rects are keyed by the flat index so the lookup builds no tuple
+                rect = self.solid_rects.get(check_x * height + check_y)
+                if rect is None:
+                    rect = pygame.Rect((check_x + self.origin[0]) * self.tile_size, (check_y + self.origin[1]) * self.tile_size, self.tile_size, self.tile_size)
+                    self.solid_rects[check_x * height + check_y] = rect
+                rects.append(rect)
 
         # return the list of neighboring tile rects
         return rects
 
+    # define a method to place a grid tile at a tile position, replacing the tile that was there, it returns whether the map changed
+    def set_tile(self, pos, tile_type, variant):
+        tile = self.get_tile(pos)
+        if tile:
+            # skip the edit if the same tile is already there so painting over it keeps the cache intact
+            if tile['type'] == tile_type and tile['variant'] == variant:
+                return False
+            self.invalidate_tile(tile)
+        self.reserve(pos[0], pos[1], pos[0] + 1, pos[1] + 1)
+        index = self.cell_index(pos[0], pos[1])
+        self.grid_types[index] = self.type_id(tile_type)
+        self.grid_variants[index] = variant
+        self.solid[index] = self.solid_types[self.grid_types[index]]
+        self.invalidate_tile({'type': tile_type, 'variant': variant, 'pos': pos})
+        self.revision += 1
+        return True
+
+    # define a method to remove the grid tile at a tile position, if there is one, it returns whether the map changed
+    def remove_tile(self, pos):
+        tile = self.get_tile(pos)
+        if tile:
+            self.invalidate_tile(tile)
+            index = self.cell_index(pos[0], pos[1])
+            self.grid_types[index] = 0
+            self.grid_variants[index] = 0
+            self.solid[index] = False
+            self.revision += 1
+            return True
+        return False
+
+    # define a method to add an offgrid tile, its pos is in pixels
+    def add_offgrid(self, tile):
+        self.index_offgrid(tile)
+        self.invalidate_tile(tile, ongrid=False)
+        self.revision += 1
+
+    # define a method to remove an offgrid tile
+    def remove_offgrid(self, tile):
+        tile = self.unindex_offgrid(tile)
+        self.invalidate_tile(tile, ongrid=False)
+        self.revision += 1
+
+    # define a method to take an offgrid tile out of the storage and the spatial index, without touching the chunk cache
+    # it returns the stored tile, which is the given tile or, if a copy was given, the stored tile equal to it
+    def unindex_offgrid(self, tile):
+        key = self.offgrid_keys.get(id(tile))
+        if key is None:
+            # the tile is a copy, so find a stored tile equal to it
+            key = next((key for key in self.offgrid_kinds.get((tile['type'], tile['variant']), ()) if self.offgrid_tiles[key] == tile), None)
+            if key is None:
+                raise ValueError('offgrid tile not in tilemap')
+        tile = self.offgrid_tiles.pop(key)
+        del self.offgrid_keys[id(tile)]
+        del self.offgrid_kinds[(tile['type'], tile['variant'])][key]
+        self.offgrid_index.remove(key)
+        return tile
+
+    # define a method to store an offgrid tile and add it to the spatial index, without touching the chunk cache
+    def index_offgrid(self, tile):
+        key = self.offgrid_next_key
+        self.offgrid_next_key += 1
+        self.offgrid_tiles[key] = tile
+        self.offgrid_keys[id(tile)] = key
+        self.offgrid_kinds.setdefault((tile['type'], tile['variant']), {})[key] = None
+        self.offgrid_index.insert(key, self.tile_rect(tile, ongrid=False))
+
+    # define a method to replace every offgrid tile with a list of tiles
+    def set_offgrid(self, tiles):
+        self.offgrid_tiles = {}
+        self.offgrid_index.clear()
+        self.offgrid_keys = {}
+        self.offgrid_kinds = {}
+        for tile in tiles:
+            self.index_offgrid(tile)
+        self.chunk_cache.clear()
+        self.revision += 1
+
+    # define a method to get the offgrid tiles overlapping a rect in pixels, in the order they are drawn
+    def offgrid_in_rect(self, rect):
+        return [self.offgrid_tiles[key] for key in sorted(self.offgrid_index.query(rect))]
+
+    # define a method to get the offgrid tiles whose image contains a point in pixels, in the order they are drawn
+    def offgrid_at(self, pos):
+        return [self.offgrid_tiles[key] for key in sorted(self.offgrid_index.query_point(pos))]
+
+    # the region methods below take rects of tile positions as (x0, y0, x1, y1), from (x0, y0) up to but excluding (x1, y1)
+    # they change the arrays with slices or index arrays and drop the baked chunks of the region once at the end
+
+    # define a method to fill a rect with one grid tile
+    def fill_rect(self, x0, y0, x1, y1, tile_type, variant):
+        if x1 <= x0 or y1 <= y0:
+            return
+        self.reserve(x0, y0, x1, y1)
+        x0_index, y0_index = self.cell_index(x0, y0)
+        region = (slice(x0_index, x0_index + x1 - x0), slice(y0_index, y0_index + y1 - y0))
+        type_id = self.type_id(tile_type)
+        self.grid_types[region] = type_id
+        self.grid_variants[region] = variant
+        self.solid[region] = self.solid_types[type_id]
+        self.invalidate_region(x0, y0, x1, y1)
+        self.revision += 1
+
+    # define a method to erase the grid tiles of a rect, and the offgrid tiles placed inside it unless offgrid is False
+    def erase_rect(self, x0, y0, x1, y1, offgrid=True):
+        # clip the rect to the arrays, there is nothing to erase outside of them
+        region = (slice(max(x0 - self.origin[0], 0), max(x1 - self.origin[0], 0)), slice(max(y0 - self.origin[1], 0), max(y1 - self.origin[1], 0)))
+        self.grid_types[region] = 0
+        self.grid_variants[region] = 0
+        self.solid[region] = False
+        self.invalidate_region(x0, y0, x1, y1)
+        if offgrid:
+            tiles = self.offgrid_in_region(x0, y0, x1, y1)
+            for tile in tiles:
+                self.unindex_offgrid(tile)
+            self.invalidate_offgrid(tiles)
+        self.revision += 1
+
+    # define a method to get the offgrid tiles placed inside a rect, by the tile position their pos falls in
+    def offgrid_in_region(self, x0, y0, x1, y1):
+        rect = pygame.Rect(x0 * self.tile_size, y0 * self.tile_size, (x1 - x0) * self.tile_size, (y1 - y0) * self.tile_size)
+        return [tile for tile in self.offgrid_in_rect(rect) if x0 <= tile['pos'][0] // self.tile_size < x1 and y0 <= tile['pos'][1] // self.tile_size < y1]
+
+    # define a method to replace the connected area of same type cells around a tile position with one grid tile, 4 neighbors connect
+    # it returns the bounding box (x0, y0, x1, y1) of the filled tile positions, or None if nothing was filled
+    # an area of empty cells is only filled if it is enclosed: it may not reach the edge of the arrays, whose bounds are arbitrary,
+    # or grow past limit cells, otherwise nothing changes
+    def flood_fill(self, pos, tile_type, variant, limit=FLOOD_FILL_LIMIT):
+        x = pos[0] - self.origin[0]
+        y = pos[1] - self.origin[1]
+        width, height = self.solid_shape
+        if not (0 <= x < width and 0 <= y < height):
+            return None
+        type_id = self.type_id(tile_type)
+        # walk the type bytes (x * height + y) and keep the visited cells in a set, so the cost follows the filled area, not the map
+        cells = self.type_cells
+        size = width * height
+        start = x * height + y
+        target = cells[start]
+        visited = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            y = i % height
+            if not target and (i < height or i >= size - height or not y or y == height - 1 or len(visited) > limit):
+                return None
+            for j in (i - 1 if y else -1, i + 1 if y < height - 1 else -1, i - height, i + height):
+                if 0 <= j < size and j not in visited and cells[j] == target:
+                    visited.add(j)
+                    stack.append(j)
+        xs, ys = np.divmod(np.fromiter(visited, dtype=np.int64, count=len(visited)), height)
+        self.grid_types[xs, ys] = type_id
+        self.grid_variants[xs, ys] = variant
+        self.solid[xs, ys] = self.solid_types[type_id]
+        box = (int(xs.min()) + self.origin[0], int(ys.min()) + self.origin[1], int(xs.max()) + 1 + self.origin[0], int(ys.max()) + 1 + self.origin[1])
+        self.invalidate_region(*box)
+        self.revision += 1
+        return box
+
+    # define a method to copy a rect into a clipboard dictionary, which paste() places somewhere else, offgrid tiles are copied too
+    def copy_region(self, x0, y0, x1, y1):
+        types = np.zeros((max(x1 - x0, 0), max(y1 - y0, 0)), dtype=np.uint8)
+        variants = np.zeros(types.shape, dtype=np.uint8)
+        # copy the part of the rect that overlaps the arrays, the rest stays empty
+        width, height = self.grid_types.shape
+        sx0, sy0 = max(x0 - self.origin[0], 0), max(y0 - self.origin[1], 0)
+        sx1, sy1 = min(x1 - self.origin[0], width), min(y1 - self.origin[1], height)
+        if sx1 > sx0 and sy1 > sy0:
+            dx, dy = sx0 + self.origin[0] - x0, sy0 + self.origin[1] - y0
+            types[dx:dx + sx1 - sx0, dy:dy + sy1 - sy0] = self.grid_types[sx0:sx1, sy0:sy1]
+            variants[dx:dx + sx1 - sx0, dy:dy + sy1 - sy0] = self.grid_variants[sx0:sx1, sy0:sy1]
+        # offgrid positions are stored relative to the top left corner of the rect, in pixels
+        offgrid = [(tile['type'], tile['variant'], (tile['pos'][0] - x0 * self.tile_size, tile['pos'][1] - y0 * self.tile_size)) for tile in self.offgrid_in_region(x0, y0, x1, y1)]
+        return {'tile_types': tuple(self.tile_types[1:]), 'grid_types': types, 'grid_variants': variants, 'offgrid': offgrid}
+
+    # define a method to paste a clipboard with its top left corner at a tile position
+    # only the cells holding a tile are written, empty cells of the clipboard keep what is under them
+    def paste(self, clipboard, pos):
+        # map the type ids of the clipboard to the type ids of this tilemap, id 0 stays empty
+        ids = np.array([0] + [self.type_id(tile_type) for tile_type in clipboard['tile_types']], dtype=np.uint8)
+        xs, ys = np.nonzero(clipboard['grid_types'])
+        if len(xs):
+            self.reserve(pos[0] + int(xs.min()), pos[1] + int(ys.min()), pos[0] + int(xs.max()) + 1, pos[1] + int(ys.max()) + 1)
+            types = ids[clipboard['grid_types'][xs, ys]]
+            self.grid_types[xs + pos[0] - self.origin[0], ys + pos[1] - self.origin[1]] = types
+            self.grid_variants[xs + pos[0] - self.origin[0], ys + pos[1] - self.origin[1]] = clipboard['grid_variants'][xs, ys]
+            self.solid[xs + pos[0] - self.origin[0], ys + pos[1] - self.origin[1]] = self.solid_types[types]
+            self.invalidate_region(pos[0], pos[1], pos[0] + clipboard['grid_types'].shape[0], pos[1] + clipboard['grid_types'].shape[1])
+        tiles = []
+        for tile_type, variant, offset in clipboard['offgrid']:
+            tiles.append({'type': tile_type, 'variant': variant, 'pos': [pos[0] * self.tile_size + offset[0], pos[1] * self.tile_size + offset[1]]})
+            self.index_offgrid(tiles[-1])
+        self.invalidate_offgrid(tiles)
+        self.revision += 1
+
+    # define a method to move a rect so its top left corner ends up at a tile position, offgrid tiles move along
+    def move_region(self, x0, y0, x1, y1, pos):
+        clipboard = self.copy_region(x0, y0, x1, y1)
+        self.erase_rect(x0, y0, x1, y1)
+        self.paste(clipboard, pos)
+
+    # define a method to autotile the grid tiles of a rect and the ring of cells around it
+    def autotile_region(self, x0, y0, x1, y1):
+        x0, y0 = max(x0 - 1 - self.origin[0], 0), max(y0 - 1 - self.origin[1], 0)
+        x1, y1 = max(x1 + 1 - self.origin[0], 0), max(y1 + 1 - self.origin[1], 0)
+        xs, ys = np.nonzero(self.grid_types[x0:x1, y0:y1])
+        self.autotile_cells(xs + x0, ys + y0)
+
+    # define a method to get the rect covered by a tile's image in pixels
+    def tile_rect(self, tile, ongrid=True):
+        # tiles without loaded images (like the spawners in the game, or any tile without a game) only cover their own cell
+        if self.game and tile['type'] in self.game.assets:
+            size = self.game.assets[tile['type']][tile['variant']].get_size()
+        else:
+            size = (self.tile_size, self.tile_size)
+        if ongrid:
+            return pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, size[0], size[1])
+        return pygame.Rect(tile['pos'][0], tile['pos'][1], size[0], size[1])
+
+    # define a method to drop the baked chunks overlapping a rect in pixels, so they are rebuilt on the next render
+    def invalidate_rect(self, rect):
+        chunk_px = CHUNK_SIZE * self.tile_size
+        for x in range(rect.left // chunk_px, (rect.right - 1) // chunk_px + 1):
+            for y in range(rect.top // chunk_px, (rect.bottom - 1) // chunk_px + 1):
+                self.chunk_cache.pop((x, y), None)
+
+    # define a method to drop the baked chunks of a rect of tile positions, from (x0, y0) up to but excluding (x1, y1)
+    def invalidate_region(self, x0, y0, x1, y1):
+        # grid tile images can reach up to CHUNK_MARGIN tiles past their cell, like in bake_chunk
+        self.invalidate_rect(pygame.Rect(x0 * self.tile_size, y0 * self.tile_size, (x1 - x0 + CHUNK_MARGIN) * self.tile_size, (y1 - y0 + CHUNK_MARGIN) * self.tile_size))
+
+    # define a method to drop the baked chunks a list of offgrid tiles is drawn on, with a single rect covering all of them
+    def invalidate_offgrid(self, tiles):
+        if tiles:
+            rects = [self.tile_rect(tile, ongrid=False) for tile in tiles]
+            self.invalidate_rect(rects[0].unionall(rects[1:]))
+
+    # define a method to drop the baked chunks a tile is drawn on
+    def invalidate_tile(self, tile, ongrid=True):
+        self.invalidate_rect(self.tile_rect(tile, ongrid=ongrid))
+
+    # define a method to bake every tile overlapping a chunk into a single surface
+    def bake_chunk(self, chunk):
+        chunk_px = CHUNK_SIZE * self.tile_size
+        chunk_rect = pygame.Rect(chunk[0] * chunk_px, chunk[1] * chunk_px, chunk_px, chunk_px)
+        blits = []
+        # offgrid tiles go first so the grid tiles are drawn on top of them
+        for tile in self.offgrid_in_rect(chunk_rect):
+            # floor the world position once so half-pixel tiles land where a direct blit at an integer camera offset put them
+            blits.append((self.game.assets[tile['type']][tile['variant']], (math.floor(tile['pos'][0]) - chunk_rect.x, math.floor(tile['pos'][1]) - chunk_rect.y)))
+
+        # slice the cells of the chunk out of the arrays, with a margin for tiles whose images reach into it
+        x0 = max(chunk[0] * CHUNK_SIZE - CHUNK_MARGIN - self.origin[0], 0)
+        y0 = max(chunk[1] * CHUNK_SIZE - CHUNK_MARGIN - self.origin[1], 0)
+        x1 = (chunk[0] + 1) * CHUNK_SIZE - self.origin[0]
+        y1 = (chunk[1] + 1) * CHUNK_SIZE - self.origin[1]
+        types = self.grid_types[x0:max(x1, 0), y0:max(y1, 0)]
+        variants = self.grid_variants[x0:max(x1, 0), y0:max(y1, 0)]
+        for x, y in np.argwhere(types).tolist():
+            img = self.game.assets[self.tile_types[types[x, y]]][variants[x, y]]
+            dest = ((x + x0 + self.origin[0]) * self.tile_size - chunk_rect.x, (y + y0 + self.origin[1]) * self.tile_size - chunk_rect.y)
+            if chunk_rect.colliderect((dest[0] + chunk_rect.x, dest[1] + chunk_rect.y, img.get_width(), img.get_height())):
+                blits.append((img, dest))
+
+        # empty chunks are cached as None so they are skipped without a blit
+        if not blits:
+            return None
+        # black is the colorkey of every tile image, so the chunk keeps the same transparency
+        chunk_surf = pygame.Surface((chunk_px, chunk_px))
+        chunk_surf.blits(blits, doreturn=False)
+        chunk_surf.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        return chunk_surf
+
     # define a method to render the tilemap
     def render(self, surface, offset=(0, 0)):
-        # loop through the offgrid tiles to render them
-        for tile in self.offgrid_tiles:
-            # get the asset from the game assets dictionary using the tile type and variant
-            surface.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-        
-        for x in range(offset[0] // self.tile_size, (offset[0] + surface.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surface.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surface.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        chunk_px = CHUNK_SIZE * self.tile_size
+        # loop through the chunks overlapping the camera and blit their baked surfaces
+        for x in range(offset[0] // chunk_px, (offset[0] + surface.get_width()) // chunk_px + 1):
+            for y in range(offset[1] // chunk_px, (offset[1] + surface.get_height()) // chunk_px + 1):
+                chunk = (x, y)
+                if chunk in self.chunk_cache:
+                    self.chunk_cache.move_to_end(chunk)
+                else:
+                    self.chunk_cache[chunk] = self.bake_chunk(chunk)
+                    if len(self.chunk_cache) > CHUNK_CACHE_LIMIT:
+                        self.chunk_cache.popitem(last=False)
+                chunk_surf = self.chunk_cache[chunk]
+                if chunk_surf:
+                    surface.blit(chunk_surf, (x * chunk_px - offset[0], y * chunk_px - offset[1]))
@@ -3,40 +3,78 @@
 # necessary imports
 import pygame
 import os
+from scripts.bundle import AssetBundle, BUNDLE_PATH
 
 # define the base path for the images
 BASE_PATH = 'data/images/'
+# define the asset bundle the images are loaded from, when it is None they are decoded from the image files
+bundle = None
+
+# define a function to load the images from a prebuilt asset bundle when it exists (see scripts/bundle.py)
+# passing None, or a path that does not exist, goes back to loading the image files
+# images edited after the bundle was built are still loaded from their files, and a bundle of an older version is ignored
+def use_bundle(path=BUNDLE_PATH):
+    global bundle
+    bundle = None
+    if path and os.path.exists(path):
+        try:
+            bundle = AssetBundle.load(path)
+        except ValueError as error:
+            print(str(error) + ', loading the image files, rebuild it with: python -m scripts.bundle')
 
 # define a function to load an image
 def load_img(path):
+    if bundle and path in bundle:
+        return bundle.img(path)
     # load the image from the path and convert it to a pygame image object
     img = pygame.image.load(BASE_PATH + path).convert()
     # set the colorkey of the image to (0, 0, 0) to make the black background transparent
-    img.set_colorkey((0, 0, 0))
+    # the images are never drawn on, so they are run-length encoded for faster blits
+    img.set_colorkey((0, 0, 0), pygame.RLEACCEL)
     return img
 
+# define a function to get a horizontally mirrored copy of an image, keeping its colorkey
+def flip_img(img):
+    flipped = pygame.transform.flip(img, True, False)
+    flipped.set_colorkey(img.get_colorkey(), pygame.RLEACCEL)
+    return flipped
+
 # define a function to load a list of images
 def load_images(path):
     # create an empty list to store the images
     images = []
 
+    # take the image names from the bundle when it has the directory, saving a directory listing
+    image_names = bundle.listing(path) if bundle else None
+    if image_names is None:
+        image_names = sorted(os.listdir(BASE_PATH + path))
+
     # loop through the files in the specified path
-    for image_name in sorted(os.listdir(BASE_PATH + path)):
+    for image_name in image_names:
         # load each image and append it to the list
         images.append(load_img(path + '/' + image_name))
     
     return images
 
 class Animation:
-    def __init__(self, frames, frame_dur=5, loop=True):
+    __slots__ = ('frames', 'flipped_frames', 'frame_duration', 'loop', 'done', 'current_frame')
+
+    # flipped_frames are the mirrored frames, they are built once here and shared by every copy of the animation
+    def __init__(self, frames, frame_dur=5, loop=True, flipped_frames=None):
         self.frames = frames
+        self.flipped_frames = flipped_frames if flipped_frames is not None else [flip_img(frame) for frame in frames]
         self.frame_duration = frame_dur
         self.loop = loop
         self.done = False
         self.current_frame = 0
 
     def copy(self):
-        return Animation(self.frames, self.frame_duration, self.loop)
+        return Animation(self.frames, self.frame_duration, self.loop, flipped_frames=self.flipped_frames)
+
+    # define a method to play the animation again from its first frame
+    def reset(self):
+        self.current_frame = 0
+        self.done = False
 
     def update(self):
         if self.loop:
@@ -46,5 +84,7 @@ class Animation:
         if self.current_frame >= (self.frame_duration * len(self.frames) - 1):
             self.done = True
 
-    def img(self):
+    def img(self, flip=False):
+        if flip:
+            return self.flipped_frames[int(self.current_frame / self.frame_duration)]
         return self.frames[int(self.current_frame / self.frame_duration)]
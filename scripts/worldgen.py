@@ -0,0 +1,113 @@
+# worldgen module generates synthetic levels of any size for benchmarks and stress tests.
+# a world is a scatter of floating platforms, grass on top of stone, with grid decor and offgrid trees, bushes and spawners
+# standing on the platforms, autotiled like a hand made level. everything is built with array operations,
+# so worlds of millions of tiles are generated in seconds.
+#
+# generate a map with: python -m scripts.worldgen --tiles 100000 --seed 0 world.ndmap (or world.json)
+import argparse
+import math
+import numpy as np
+from scripts.tilemap import Tilemap
+
+# define the fraction of the world area covered by tiles, which sets the size of the world for a number of tiles
+WORLD_DENSITY = 0.2
+# define the range of the platform lengths and thicknesses in tiles, the upper bounds are excluded
+PLATFORM_LENGTH = (4, 25)
+PLATFORM_THICKNESS = (1, 5)
+# define the chance of a top grass tile to carry each kind of decoration
+DECOR_CHANCE = 0.08
+TREE_CHANCE = 0.02
+BUSH_CHANCE = 0.03
+ENEMY_CHANCE = 0.01
+# define the heights in pixels of the large decor images (bushes 0 and 1, the tree 2) and of the spawner images,
+# so the generated decor stands on its platform without loading the images
+LARGE_DECOR_HEIGHTS = (9, 12, 44)
+SPAWNER_HEIGHT = 15
+# define the number of variants of the grid decor images
+DECOR_VARIANTS = 4
+
+# define a function to stamp platforms into a tilemap, each platform given by its top left tile position, length and thickness
+def stamp_platforms(tilemap, xs, ys, lengths, thicknesses):
+    sizes = lengths * thicknesses
+    # give every cell of every platform its index inside its platform, then split it into a column and a row
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    cell_lengths = np.repeat(lengths, sizes)
+    dx, dy = local % cell_lengths, local // cell_lengths
+    cell_xs = np.repeat(xs, sizes) + dx
+    cell_ys = np.repeat(ys, sizes) + dy
+    # the top row of a platform is grass, the rows below are stone
+    types = np.where(dy == 0, tilemap.type_id('grass'), tilemap.type_id('stone')).astype(np.uint8)
+    tilemap.place_tiles(cell_xs, cell_ys, types, np.zeros(len(cell_xs), dtype=np.uint8))
+
+# define a function to generate a world of about a number of grid tiles, the result is a tilemap without a game
+def generate_world(tiles, seed=0, tile_size=16):
+    rng = np.random.default_rng(seed)
+    tilemap = Tilemap(None, tile_size)
+    # the world is four times wider than high
+    area = tiles / WORLD_DENSITY
+    width = max(int(math.sqrt(area * 4)), PLATFORM_LENGTH[1])
+    height = max(int(area / width), PLATFORM_THICKNESS[1] + 2)
+    mean_size = (sum(PLATFORM_LENGTH) - 1) / 2 * (sum(PLATFORM_THICKNESS) - 1) / 2
+
+    # add platforms until the world holds enough tiles, overlapping platforms share cells so a second round tops it up
+    platform_tiles = tiles / (1 + DECOR_CHANCE)
+    count = math.ceil(platform_tiles / mean_size)
+    for i in range(8):
+        lengths = rng.integers(PLATFORM_LENGTH[0], PLATFORM_LENGTH[1], count)
+        thicknesses = rng.integers(PLATFORM_THICKNESS[0], PLATFORM_THICKNESS[1], count)
+        xs = rng.integers(0, width, count)
+        # keep a free row above every platform for the decor
+        ys = rng.integers(2, height, count)
+        stamp_platforms(tilemap, xs, ys, lengths, thicknesses)
+        placed = int(np.count_nonzero(tilemap.grid_types))
+        if placed >= platform_tiles:
+            break
+        count = math.ceil((platform_tiles - placed) / mean_size)
+
+    # find the grass tiles with an empty cell above them, the decor and the spawners stand on them
+    grass = tilemap.grid_types == tilemap.type_id('grass')
+    open_above = np.zeros(grass.shape, dtype=bool)
+    open_above[:, 1:] = tilemap.grid_types[:, :-1] == 0
+    top_xs, top_ys = np.nonzero(grass & open_above)
+    roll = rng.random(len(top_xs))
+
+    # grid decor goes in the cell above the grass
+    decor = roll < DECOR_CHANCE
+    tilemap.grid_types[top_xs[decor], top_ys[decor] - 1] = tilemap.type_id('decor')
+    tilemap.grid_variants[top_xs[decor], top_ys[decor] - 1] = rng.integers(0, DECOR_VARIANTS, int(np.count_nonzero(decor)))
+    tilemap.rebuild_solid()
+    tilemap.autotile()
+
+    # offgrid trees, bushes and enemy spawners take the next slices of the roll, their pos is in pixels
+    offgrid = []
+    pixel_xs = (top_xs + tilemap.origin[0]) * tile_size
+    pixel_ys = (top_ys + tilemap.origin[1]) * tile_size
+    kinds = (
+        ('large_decor', 2, TREE_CHANCE, LARGE_DECOR_HEIGHTS[2]),
+        ('large_decor', 0, BUSH_CHANCE / 2, LARGE_DECOR_HEIGHTS[0]),
+        ('large_decor', 1, BUSH_CHANCE / 2, LARGE_DECOR_HEIGHTS[1]),
+        ('spawners', 1, ENEMY_CHANCE, SPAWNER_HEIGHT),
+    )
+    low = DECOR_CHANCE
+    for tile_type, variant, chance, img_height in kinds:
+        chosen = np.flatnonzero((roll >= low) & (roll < low + chance))
+        low += chance
+        shifts = rng.random(len(chosen)) * tile_size
+        for x, y in zip((pixel_xs[chosen] + shifts).tolist(), (pixel_ys[chosen] - img_height).tolist()):
+            offgrid.append({'type': tile_type, 'variant': variant, 'pos': [x, y]})
+    # the player starts on the first platform top
+    if len(top_xs):
+        offgrid.append({'type': 'spawners', 'variant': 0, 'pos': [int(pixel_xs[0]), int(pixel_ys[0]) - SPAWNER_HEIGHT]})
+    tilemap.set_offgrid(offgrid)
+    return tilemap
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='generate a synthetic level')
+    parser.add_argument('target', help='map to write, binary if it ends with .ndmap, JSON otherwise')
+    parser.add_argument('--tiles', type=int, default=100000, help='approximate number of grid tiles')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random number generator')
+    args = parser.parse_args()
+
+    tilemap = generate_world(args.tiles, seed=args.seed)
+    tilemap.save(args.target)
+    print('wrote %d grid tiles and %d offgrid tiles to %s' % (np.count_nonzero(tilemap.grid_types), len(tilemap.offgrid_tiles), args.target))
@@ -0,0 +1,58 @@
+# tests for the memory the entity ticks allocate, checked with tracemalloc on the shipped levels
+# a steady state tick may create short lived objects but must not leave any new block alive
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+import tracemalloc
+import pytest
+
+# run the game without a display from the root of the repository, it loads its assets and levels by relative path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import benchmark
+from game import Game
+
+# define the number of ticks played with scripted input before the entity states are saved
+WARMUP = 60
+# define the number of entity ticks in the window played from the saved states
+TICKS = 300
+# define the files whose live blocks are compared before and after the window
+TRACED_FILES = (os.path.join(ROOT, 'scripts', 'entities.py'), os.path.join(ROOT, 'scripts', 'tilemap.py'))
+
+@pytest.fixture(scope='module')
+def game():
+    os.chdir(ROOT)
+    return Game(headless=True)
+
+@pytest.mark.parametrize('map_id', benchmark.SHIPPED_MAPS)
+def test_entity_ticks_keep_no_blocks(game, map_id):
+    entities, states = benchmark.prepare_entity_window(game, map_id, WARMUP, 0)
+    def tick():
+        for entity in entities:
+            entity.update(game.tilemap, (0, 0))
+    filters = [tracemalloc.Filter(True, path) for path in TRACED_FILES]
+    tracemalloc.start()
+    try:
+        # the first pass fills the caches, the second one plays the same ticks again and must leave nothing behind
+        benchmark.play_entity_window(game, entities, states, TICKS, tick)
+        benchmark.reset_entities(game, entities, states)
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        benchmark.play_entity_window(game, entities, states, TICKS, tick)
+        benchmark.reset_entities(game, entities, states)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+    finally:
+        tracemalloc.stop()
+    # freed floats and lists wait in free lists and keep the line that first allocated them, so blocks can move
+    # from one line to another between the snapshots, only their total has to stay the same
+    changed = [stat for stat in after.compare_to(before, 'lineno') if stat.count_diff]
+    assert sum(stat.count_diff for stat in changed) == 0, [str(stat) for stat in changed]
+
+@pytest.mark.parametrize('map_id', benchmark.SHIPPED_MAPS)
+def test_entity_tick_allocation_budget(game, map_id):
+    allocated = benchmark.entity_allocations(game, map_id, TICKS, WARMUP, 0)
+    assert allocated['median'] <= benchmark.ALLOCATION_BUDGET, allocated
+    assert allocated['max'] <= benchmark.ALLOCATION_PEAK_BUDGET, allocated
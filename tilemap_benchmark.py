@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# tilemap_benchmark times the Tilemap operations on synthetic worlds of growing size (see scripts/worldgen.py)
+# and reports the time and the peak memory of each operation per size as JSON, giving scaling curves to compare changes against.
+#
+# usage: python tilemap_benchmark.py [--sizes 1000 10000 100000 1000000] [--queries 10000] [--output tilemap_benchmark.json]
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pygame
+from game import Game
+from scripts.tilemap import Tilemap
+from scripts.mapformat import MAP_EXTENSION
+from scripts.worldgen import generate_world
+
+# define the offgrid tiles the extract benchmark looks for, the ones the game extracts when it loads a level
+EXTRACT_PAIRS = [('large_decor', 2), ('spawners', 0), ('spawners', 1)]
+
+# define a function to time a function, it returns the mean and the best time in ms over a number of runs and the peak memory in bytes
+# the setup function runs before every run, outside of the timing, and the peak memory is measured on a separate run
+def measure(fn, runs=3, setup=None):
+    times = []
+    for i in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'mean_ms': float(np.mean(times)), 'best_ms': float(min(times)), 'peak_bytes': peak}
+
+# define a function to get random pixel positions inside the arrays of a tilemap
+def random_points(tilemap, count, rng):
+    width, height = tilemap.grid_types.shape
+    low = np.array(tilemap.origin) * tilemap.tile_size
+    return (low + rng.random((count, 2)) * (width * tilemap.tile_size, height * tilemap.tile_size)).tolist()
+
+# define a function to run every benchmark on a world of one size
+def run_size(game, size, queries, seed, map_dir, json_limit):
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    world = generate_world(size, seed=seed)
+    result = {
+        'size': size,
+        'tiles': int(np.count_nonzero(world.grid_types)),
+        'offgrid_tiles': len(world.offgrid_tiles),
+        'generate_ms': (time.perf_counter() - start) * 1000,
+        'operations': {},
+    }
+    operations = result['operations']
+    paths = {'ndmap': os.path.join(map_dir, 'world' + MAP_EXTENSION)}
+    # JSON maps of the largest sizes take gigabytes to parse, so they are only used up to a limit
+    if size <= json_limit:
+        paths['json'] = os.path.join(map_dir, 'world.json')
+    for name, path in paths.items():
+        operations['save_' + name] = measure(lambda: world.save(path))
+    for name, path in paths.items():
+        operations['load_' + name] = measure(lambda: Tilemap(game).load(path))
+
+    tilemap = Tilemap(game)
+    tilemap.load(paths['ndmap'])
+    operations['extract'] = measure(lambda: tilemap.extract(EXTRACT_PAIRS, keep=True))
+
+    # autotile from scrambled variants so the pass has work to do
+    variants = tilemap.grid_variants.copy()
+    def scramble():
+        tilemap.grid_variants[:] = rng.integers(0, 9, tilemap.grid_variants.shape)
+    operations['autotile'] = measure(tilemap.autotile, setup=scramble)
+    tilemap.grid_variants[:] = variants
+
+    # the queries made by the physics every frame, timed over many random positions
+    points = random_points(tilemap, queries, rng)
+    for name, query in (('tiles_around', tilemap.tiles_around), ('neighboring_tiles_physics', tilemap.neighboring_tiles_physics), ('check_solid', tilemap.check_solid)):
+        operations[name] = measure(lambda: [query(point) for point in points])
+        operations[name]['per_call_us'] = operations[name]['mean_ms'] * 1000 / queries
+
+    # the spawners are not drawn by the game, it extracts them before rendering
+    tilemap.extract([('spawners', 0), ('spawners', 1)])
+    cameras = [(int(x) - 160, int(y) - 120) for x, y in random_points(tilemap, 20, rng)]
+    def render_all():
+        for camera in cameras:
+            tilemap.render(game.screen, offset=camera)
+    # a cold render bakes every chunk in view, a warm render only blits the cached chunks
+    operations['render_cold'] = measure(render_all, setup=tilemap.chunk_cache.clear)
+    operations['render_warm'] = measure(render_all)
+    for name in ('render_cold', 'render_warm'):
+        operations[name]['per_frame_ms'] = operations[name]['mean_ms'] / len(cameras)
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tilemap scaling benchmark')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000, 10000, 100000, 1000000], help='approximate numbers of grid tiles of the generated worlds')
+    parser.add_argument('--queries', type=int, default=10000, help='number of random positions the query benchmarks use')
+    parser.add_argument('--json-limit', type=int, default=1000000, help='largest size also saved and loaded as JSON')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the world generator and the random positions')
+    parser.add_argument('--output', default='tilemap_benchmark.json', help='path of the JSON report')
+    args = parser.parse_args()
+
+    # the game provides the tile images and the screen the render benchmarks draw on
+    game = Game(headless=True)
+    results = []
+    with tempfile.TemporaryDirectory() as map_dir:
+        for size in args.sizes:
+            results.append(run_size(game, size, args.queries, args.seed, map_dir, args.json_limit))
+            print('%d tiles, %d offgrid tiles, generated in %.1f ms' % (results[-1]['tiles'], results[-1]['offgrid_tiles'], results[-1]['generate_ms']))
+            for name, values in results[-1]['operations'].items():
+                print('  %-26s %10.3f ms mean %10.3f ms best %12d bytes peak' % (name, values['mean_ms'], values['best_ms'], values['peak_bytes']))
+
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'queries': args.queries,
+        'results': results,
+    }
+    file = open(args.output, 'w')
+    json.dump(report, file, indent=2)
+    file.close()
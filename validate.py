@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# validate checks every level in a map directory before it ships, spreading the work over a process pool, one worker per core.
+# the static checks run on the level file: the player spawner exists, no enemy spawns inside a solid tile
+# and every enemy can be reached from the player start. then every level is played headless with random input
+# from several seeds, counting the times the player falls for longer than the air time death of Player.update.
+# before the random play the player is left without input at the start, a level fails if it falls to death from there.
+# the falls of the random play are told apart by where they happen:
+#   edge falls leave the horizontal extent of the tiles, random play walks off the open ends of a level, they are only reported
+#   pit falls happen inside the level, a level fails if they are more frequent than --max-fall-rate per minute of play
+#
+# usage: python validate.py [--maps data/maps] [--minutes 2] [--runs 4] [--max-fall-rate 30] [--processes N] [--output validation.json]
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+import numpy as np
+import pygame
+from scripts.level import LevelTemplate
+from scripts.mapformat import MAP_EXTENSION
+from scripts.tilemap import Tilemap
+
+# define the size of the enemy rect the game spawns enemies with, in pixels
+ENEMY_SIZE = (8, 15)
+# define how many tiles above the highest tile the player can get to, about the height of a jump
+JUMP_CELLS = 3
+# define the air time after which Player.update kills the player, in ticks
+FALL_TICKS = 120
+# define the default number of pit falls per minute of random play a level may have, the shipped levels
+# have pits random play falls into up to about 17 times a minute
+MAX_FALL_RATE = 30
+
+# store the headless game of a worker process, created once by init_worker and reused by every run of the worker
+game = None
+
+# define a function to list the levels of a map directory as (name, path), a binary level replaces its JSON version like in Game.level_path
+def level_files(map_dir):
+    paths = {}
+    for file_name in os.listdir(map_dir):
+        name, extension = os.path.splitext(file_name)
+        if extension == MAP_EXTENSION or (extension == '.json' and name not in paths):
+            paths[name] = os.path.join(map_dir, file_name)
+    # numbered levels are listed in play order
+    return sorted(paths.items(), key=lambda item: (not item[0].isdigit(), int(item[0]) if item[0].isdigit() else 0, item[0]))
+
+# define a function to get the tiles of a pixel rect as a (x0, y0, x1, y1) range of tile positions, x1 and y1 excluded
+def rect_cells(tilemap, rect):
+    return (rect.left // tilemap.tile_size, rect.top // tilemap.tile_size,
+            (rect.right - 1) // tilemap.tile_size + 1, (rect.bottom - 1) // tilemap.tile_size + 1)
+
+# define a function to find the open cells the player can move through from a tile position
+# the player moves through open cells inside the bounds of the tiles and up to JUMP_CELLS above the highest tile,
+# which ignores the physics of the moves but finds enemies sealed off by solid tiles or placed out of the level
+# the result is a boolean array indexed [x, y] from the tile position origin
+def open_cells(tilemap, start):
+    xs, ys = np.nonzero(tilemap.grid_types)
+    if not len(xs):
+        return np.zeros((0, 0), dtype=bool), (0, 0)
+    x0, x1 = int(xs.min()), int(xs.max()) + 1
+    y0, y1 = max(int(ys.min()) - JUMP_CELLS, 0), int(ys.max()) + 1
+    # pad the arrays on top so the cells above the highest tile exist
+    pad = max(JUMP_CELLS - int(ys.min()), 0)
+    solid = np.ones((x1 - x0, y1 - y0 + pad), dtype=bool)
+    solid[:, pad:] = tilemap.solid[x0:x1, y0:y1].astype(bool)
+    origin = (tilemap.origin[0] + x0, tilemap.origin[1] + y0 - pad)
+    solid[:, :pad] = False
+
+    reached = np.zeros(solid.shape, dtype=bool)
+    x, y = start[0] - origin[0], start[1] - origin[1]
+    if not (0 <= x < solid.shape[0] and 0 <= y < solid.shape[1]) or solid[x, y]:
+        return reached, origin
+    reached[x, y] = True
+    queue = deque([(x, y)])
+    width, height = solid.shape
+    while queue:
+        x, y = queue.popleft()
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < width and 0 <= ny < height and not reached[nx, ny] and not solid[nx, ny]:
+                reached[nx, ny] = True
+                queue.append((nx, ny))
+    return reached, origin
+
+# define a function to run the static checks of a level file, it needs neither the game nor a display
+# it returns the name, the number of enemies, whether the level can be played and a list of problems
+def check_level(name, path):
+    template = LevelTemplate.load(path)
+    tilemap = Tilemap(None)
+    tilemap.restore(template.tilemap)
+    problems = []
+    if template.player_pos is None:
+        problems.append('no player spawner (spawners variant 0)')
+        return name, len(template.enemy_positions), False, problems
+
+    start = (int(template.player_pos[0] + 4) // tilemap.tile_size, int(template.player_pos[1] + 7) // tilemap.tile_size)
+    reached, origin = open_cells(tilemap, start)
+    for i, pos in enumerate(template.enemy_positions):
+        rect = pygame.Rect(pos, ENEMY_SIZE)
+        x0, y0, x1, y1 = rect_cells(tilemap, rect)
+        if any(tilemap.check_solid((x * tilemap.tile_size, y * tilemap.tile_size)) for x in range(x0, x1) for y in range(y0, y1)):
+            problems.append('enemy %d at %s spawns inside a solid tile' % (i, list(pos)))
+            continue
+        x, y = rect.centerx // tilemap.tile_size - origin[0], rect.centery // tilemap.tile_size - origin[1]
+        if not (0 <= x < reached.shape[0] and 0 <= y < reached.shape[1] and reached[x, y]):
+            problems.append('enemy %d at %s cannot be reached from the player start' % (i, list(pos)))
+    return name, len(template.enemy_positions), True, problems
+
+# define the function the pool runs once in every worker process, it creates the headless game the runs share
+def init_worker():
+    global game
+    from game import Game
+    game = Game(headless=True)
+
+# define a function to restart the level of a run, with a fresh player and the random streams seeded
+def start_run(name, map_dir, seed):
+    from scripts.entities import Player
+    game.map_dir = map_dir + os.sep
+    game.seed_random(seed)
+    # start from a fresh player, a previous run may have left it dashing or holding a direction
+    game.player = Player(game, (59, 50), (8, 15))
+    game.movement_x = [False, False]
+    game.load_level(name)
+    game.tick = 0
+
+# define a function to tell if the player lands on a tile when left without input at the start of the level
+# an enemy killing the player first does not tell anything about the spawn, so it counts as landing
+def spawn_lands():
+    for i in range(FALL_TICKS + 1):
+        game.update()
+        if game.player.collision_flags['down']:
+            return True
+        if game.dead:
+            return game.player.air_time <= FALL_TICKS
+    return True
+
+# define a function to play a level headless with random input from a seed
+# it returns the name, the seed, the ticks played, whether the spawn lands, the edge and pit falls, the other deaths and the ticks per second
+def play_level(name, map_dir, seed, ticks):
+    from scripts.inputs import ScriptedInput
+    start_run(name, map_dir, seed)
+    lands = spawn_lands()
+    start_run(name, map_dir, seed)
+    # get the horizontal extent of the tiles in pixels, a fall outside of it went off an end of the level
+    xs = np.nonzero(game.tilemap.grid_types)[0]
+    left = (int(xs.min()) + game.tilemap.origin[0]) * game.tilemap.tile_size if len(xs) else 0
+    right = (int(xs.max()) + 1 + game.tilemap.origin[0]) * game.tilemap.tile_size if len(xs) else 0
+    inputs = ScriptedInput.random(ticks, seed=seed)
+    edge_falls = 0
+    pit_falls = 0
+    deaths = 0
+    start = time.perf_counter()
+    for i in range(ticks):
+        for event in inputs.events(game.tick):
+            game.handle_event(event)
+        was_dead = game.dead
+        game.update()
+        if game.dead and not was_dead:
+            if game.player.air_time <= FALL_TICKS:
+                deaths += 1
+            elif left <= game.player.rect().centerx < right:
+                pit_falls += 1
+            else:
+                edge_falls += 1
+    return name, seed, ticks, lands, edge_falls, pit_falls, deaths, ticks / max(time.perf_counter() - start, 1e-9)
+
+# define functions unpacking the task tuples, pool.imap_unordered passes a single argument
+def check_task(task):
+    return check_level(*task)
+
+def play_task(task):
+    return play_level(*task)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ninja Dash level validator')
+    parser.add_argument('--maps', default='data/maps', help='directory of the levels to validate')
+    parser.add_argument('--minutes', type=float, default=2, help='minutes of random play per run, at 60 ticks per second')
+    parser.add_argument('--runs', type=int, default=4, help='number of random play runs per level, each with its own seed')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first run, the others use the following seeds')
+    parser.add_argument('--max-fall-rate', type=float, default=MAX_FALL_RATE, help='pit falls per minute of play a run may have before its level fails')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes, one per core by default')
+    parser.add_argument('--output', default=None, help='also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    levels = level_files(args.maps)
+    ticks = int(args.minutes * 60 * 60)
+    processes = args.processes or os.cpu_count()
+    report = {name: {'path': path, 'problems': [], 'runs': []} for name, path in levels}
+
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(processes, initializer=init_worker)
+    playable = set()
+    for name, enemies, can_play, problems in pool.imap_unordered(check_task, levels):
+        report[name]['enemies'] = enemies
+        report[name]['problems'] += problems
+        if can_play:
+            playable.add(name)
+    # a level without a player start cannot be played
+    tasks = [(name, args.maps, args.seed + run, ticks) for name, path in levels if name in playable for run in range(args.runs)]
+    for name, seed, run_ticks, lands, edge_falls, pit_falls, deaths, tps in pool.imap_unordered(play_task, tasks):
+        report[name]['runs'].append({'seed': seed, 'ticks': run_ticks, 'spawn_lands': lands, 'edge_falls': edge_falls, 'pit_falls': pit_falls,
+                                     'deaths': deaths, 'ticks_per_second': tps})
+        if not lands:
+            report[name]['problems'].append('seed %d: the player falls to death from the start without input' % seed)
+        if pit_falls > args.max_fall_rate * run_ticks / 3600:
+            report[name]['problems'].append('seed %d: the player fell into pits %d times in %.1f minutes, more than %g a minute'
+                                            % (seed, pit_falls, run_ticks / 3600, args.max_fall_rate))
+    pool.close()
+    pool.join()
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for name, path in levels:
+        level = report[name]
+        level['runs'].sort(key=lambda run: run['seed'])
+        level['passed'] = not level['problems']
+        failed += not level['passed']
+        print('%-12s %s  %d enemies, %d runs, %d edge falls, %d pit falls, %d other deaths'
+              % (name, 'ok  ' if level['passed'] else 'FAIL', level.get('enemies', 0), len(level['runs']), sum(run['edge_falls'] for run in level['runs']),
+                 sum(run['pit_falls'] for run in level['runs']), sum(run['deaths'] for run in level['runs'])))
+        for problem in level['problems']:
+            print('    ' + problem)
+    total_ticks = sum(run['ticks'] for level in report.values() for run in level['runs'])
+    print('%d of %d levels passed, %d runs of %d ticks on %d processes in %.1f s, %.0f ticks per second, %.2f levels per second'
+          % (len(levels) - failed, len(levels), len(tasks), ticks, processes, elapsed, total_ticks / elapsed, len(levels) / elapsed))
+
+    if args.output:
+        file = open(args.output, 'w')
+        json.dump({'processes': processes, 'ticks_per_run': ticks, 'seconds': elapsed, 'ticks_per_second': total_ticks / elapsed, 'levels': report}, file, indent=2)
+        file.close()
+    raise SystemExit(1 if failed else 0)